@@ -0,0 +1,5 @@
+#!/bin/bash
+
+# Local SMTP sink that prints every message instead of delivering it.
+# Run the app and workers with MAIL_SERVER=localhost, MAIL_PORT=1025 and MAIL_USE_TLS=False.
+python3 -m aiosmtpd -n -l localhost:1025
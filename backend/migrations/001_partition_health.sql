@@ -0,0 +1,78 @@
+-- Converts an existing, unpartitioned health table into monthly range
+-- partitions on "timestamp", with partitions from the oldest reading up to
+-- three months ahead. db.create_all() never alters existing tables, so
+-- databases created before the health table was partitioned need this once.
+-- Safe to re-run; afterwards the daily health-partitions task keeps creating
+-- the upcoming months.
+--
+--   psql "$SQLALCHEMY_DATABASE_URI" -f migrations/001_partition_health.sql
+
+BEGIN;
+
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'health'::regclass) = 'r' THEN
+        ALTER TABLE health RENAME TO health_unpartitioned;
+        ALTER INDEX health_pkey RENAME TO health_unpartitioned_pkey;
+        ALTER INDEX IF EXISTS ix_health_userid_timestamp
+            RENAME TO ix_health_unpartitioned_userid_timestamp;
+        ALTER SEQUENCE health_healthid_seq OWNED BY NONE;
+
+        CREATE TABLE health (
+            LIKE health_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+        ) PARTITION BY RANGE ("timestamp");
+        ALTER TABLE health ADD PRIMARY KEY (healthid, "timestamp");
+        ALTER TABLE health
+            ADD FOREIGN KEY (userid) REFERENCES "user" (userid) ON DELETE CASCADE;
+        ALTER SEQUENCE health_healthid_seq OWNED BY health.healthid;
+        CREATE INDEX ix_health_userid_timestamp ON health (userid, "timestamp");
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS health_default PARTITION OF health DEFAULT;
+
+-- Months whose rows already sit in the default partition are built as
+-- standalone tables, filled from it, then attached.
+DO $$
+DECLARE
+    this_month date := date_trunc('month', now() AT TIME ZONE 'Asia/Kolkata');
+    oldest date;
+    month date;
+    name text;
+BEGIN
+    IF to_regclass('health_unpartitioned') IS NOT NULL THEN
+        SELECT date_trunc('month', min("timestamp")) INTO oldest
+        FROM health_unpartitioned;
+    END IF;
+    month := least(coalesce(oldest, this_month), this_month);
+    WHILE month <= this_month + interval '3 months' LOOP
+        name := to_char(month, '"health_y"YYYY"m"MM');
+        IF to_regclass(name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE health INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                name
+            );
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM health_default '
+                'WHERE "timestamp" >= %L AND "timestamp" < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                month, month + interval '1 month', name
+            );
+            EXECUTE format(
+                'ALTER TABLE health ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                name, month, month + interval '1 month'
+            );
+        END IF;
+        month := month + interval '1 month';
+    END LOOP;
+END $$;
+
+DO $$
+BEGIN
+    IF to_regclass('health_unpartitioned') IS NOT NULL THEN
+        INSERT INTO health SELECT * FROM health_unpartitioned;
+        DROP TABLE health_unpartitioned;
+    END IF;
+END $$;
+
+COMMIT;
@@ -0,0 +1,39 @@
+-- Recreates the foreign keys to "user" with ON DELETE CASCADE, so deleting
+-- an account also removes its readings, ECG strips, daily risk, rollups and
+-- mail ledger rows. db.create_all() never alters existing constraints.
+-- Safe to re-run.
+--
+--   psql "$SQLALCHEMY_DATABASE_URI" -f migrations/002_cascade_user_deletes.sql
+
+BEGIN;
+
+DO $$
+DECLARE
+    child text;
+    fk record;
+BEGIN
+    FOREACH child IN ARRAY ARRAY[
+        'health', 'ecgstrip', 'dailyrisk', 'healthdailyrollup',
+        'healthweeklyrollup', 'mailledger'
+    ] LOOP
+        IF to_regclass(child) IS NULL THEN
+            CONTINUE;
+        END IF;
+        FOR fk IN
+            SELECT conname FROM pg_constraint
+            WHERE conrelid = child::regclass
+              AND contype = 'f'
+              AND confrelid = '"user"'::regclass
+              AND confdeltype <> 'c'
+        LOOP
+            EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', child, fk.conname);
+            EXECUTE format(
+                'ALTER TABLE %I ADD CONSTRAINT %I FOREIGN KEY (userid) '
+                'REFERENCES "user" (userid) ON DELETE CASCADE',
+                child, fk.conname
+            );
+        END LOOP;
+    END LOOP;
+END $$;
+
+COMMIT;
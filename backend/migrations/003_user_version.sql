@@ -0,0 +1,12 @@
+-- Adds user.version, the row version behind optimistic locking and the
+-- account ETags (user-020). db.create_all() never alters existing tables.
+-- Safe to re-run.
+--
+--   psql "$SQLALCHEMY_DATABASE_URI" -f migrations/003_user_version.sql
+
+BEGIN;
+
+ALTER TABLE "user" ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1;
+ALTER TABLE "user" ALTER COLUMN version DROP DEFAULT;
+
+COMMIT;
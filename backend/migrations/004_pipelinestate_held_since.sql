@@ -0,0 +1,7 @@
+-- Adds pipelinestate.held_since, the time an incremental pipeline's
+-- watermark started waiting on a gap in the healthids. db.create_all()
+-- never alters existing tables. Safe to re-run.
+--
+--   psql "$SQLALCHEMY_DATABASE_URI" -f migrations/004_pipelinestate_held_since.sql
+
+ALTER TABLE pipelinestate ADD COLUMN IF NOT EXISTS held_since timestamp;
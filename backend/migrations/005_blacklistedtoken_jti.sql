@@ -0,0 +1,35 @@
+-- Replaces blacklistedtoken.token with jti, the token id stored at logout
+-- (user-012). db.create_all() never alters existing tables. Tokens revoked
+-- before the change had no jti claim; their row gets the SHA-256 of the
+-- token, which is the id token_id() derives for such tokens. Safe to re-run.
+--
+--   psql "$SQLALCHEMY_DATABASE_URI" -f migrations/005_blacklistedtoken_jti.sql
+
+BEGIN;
+
+ALTER TABLE blacklistedtoken ADD COLUMN IF NOT EXISTS jti varchar(64);
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'blacklistedtoken' AND column_name = 'token'
+    ) THEN
+        UPDATE blacklistedtoken
+        SET jti = encode(sha256(convert_to(token, 'UTF8')), 'hex')
+        WHERE jti IS NULL;
+        ALTER TABLE blacklistedtoken DROP COLUMN token;
+    END IF;
+END $$;
+ALTER TABLE blacklistedtoken ALTER COLUMN jti SET NOT NULL;
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'blacklistedtoken_jti_key'
+    ) THEN
+        ALTER TABLE blacklistedtoken
+            ADD CONSTRAINT blacklistedtoken_jti_key UNIQUE (jti);
+    END IF;
+END $$;
+CREATE INDEX IF NOT EXISTS ix_blacklistedtoken_expiry ON blacklistedtoken (expiry);
+
+COMMIT;
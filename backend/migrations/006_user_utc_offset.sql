@@ -0,0 +1,8 @@
+-- Adds user.utc_offset, the user's offset from UTC in minutes used to
+-- schedule their mail (user-025). Existing users default to IST.
+-- db.create_all() never alters existing tables; the mailledger table it
+-- creates itself. Safe to re-run.
+--
+--   psql "$SQLALCHEMY_DATABASE_URI" -f migrations/006_user_utc_offset.sql
+
+ALTER TABLE "user" ADD COLUMN IF NOT EXISTS utc_offset integer NOT NULL DEFAULT 330;
@@ -38,20 +38,44 @@ def create_app(config_class=Config):
     from sportai_app.tasks import (
         daily_mail,
         weekly_report,
+        delete_blacklisted_tokens,
+        daily_risk,
+        user_corpora,
+        health_partitions,
+        health_rollups,
     )
 
     celery_app.conf.beat_schedule = {
+        # Mail runs every half hour so that each UTC offset bucket, including
+        # the half-hour ones like IST, is picked up at its local send time;
+        # the mail ledger keeps the repeated runs from sending twice.
         "weekly-report": {
             "task": "sportai_app.tasks.weekly_report",
-            "schedule": crontab(minute="*/10"),
+            "schedule": crontab(minute="0,30"),
+        },
+        "delete-blacklisted-tokens": {
+            "task": "sportai_app.tasks.delete_blacklisted_tokens",
+            "schedule": crontab(minute=30),
         },
-        # "delete-blacklisted-tokens": {
-        #     "task": "sportai_app.tasks.delete_blacklisted_tokens",
-        #     "schedule": crontab(minute="*/10"),
-        # },
         "daily-mail": {
             "task": "sportai_app.tasks.daily_mail",
-            "schedule": crontab(minute="*/10"),
+            "schedule": crontab(minute="0,30"),
+        },
+        "daily-risk": {
+            "task": "sportai_app.tasks.daily_risk",
+            "schedule": crontab(minute=0),
+        },
+        "user-corpora": {
+            "task": "sportai_app.tasks.user_corpora",
+            "schedule": crontab(minute="*/15"),
+        },
+        "health-partitions": {
+            "task": "sportai_app.tasks.health_partitions",
+            "schedule": crontab(hour=0, minute=5),
+        },
+        "health-rollups": {
+            "task": "sportai_app.tasks.health_rollups",
+            "schedule": crontab(minute="*/15"),
         },
     }
 
@@ -0,0 +1,97 @@
+import json
+import base64
+import hashlib
+from flask import current_app
+from sportai_app import cache
+
+FIGURE_SIZES = {
+    "stacked_bar": (10, 5),
+    "pie": (8, 8),
+    "line": (10, 5),
+    "dual_bar": (10, 8),
+}
+
+_figures = {}
+
+
+def _figure(kind):
+    """Returns this process' reusable figure for `kind`, cleared for drawing.
+
+    Figures are built with the object-oriented API and never registered
+    with pyplot, so they are neither leaked nor shared through its global
+    state.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = _figures.get(kind)
+    if fig is None:
+        fig = _figures[kind] = Figure(figsize=FIGURE_SIZES[kind])
+        FigureCanvasAgg(fig)
+    fig.clear()
+    return fig
+
+
+def _draw(spec):
+    import io
+    import numpy as np
+
+    kind = spec["kind"]
+    fig = _figure(kind)
+    labels = spec.get("labels", [])
+    if kind == "stacked_bar":
+        ax = fig.subplots()
+        bottom = np.zeros(len(labels))
+        for name, values in spec["series"].items():
+            values = np.nan_to_num(np.asarray(values, dtype=float))
+            ax.bar(labels, values, bottom=bottom, label=name)
+            bottom += values
+        ax.set_ylabel(spec.get("ylabel", ""))
+        ax.legend(loc="upper right", fontsize="small")
+    elif kind == "pie":
+        ax = fig.subplots()
+        ax.pie(spec["values"], labels=labels, autopct="%1.1f%%", startangle=90)
+    elif kind == "line":
+        ax = fig.subplots()
+        values = np.asarray(spec["values"], dtype=float)
+        ax.plot(labels, values, marker="o", color=spec.get("color"))
+        ax.set_ylabel(spec.get("ylabel", ""))
+    elif kind == "dual_bar":
+        top_ax, bottom_ax = fig.subplots(2, 1, sharex=True)
+        for ax, part in ((top_ax, "top"), (bottom_ax, "bottom")):
+            values = np.asarray(spec[part]["values"], dtype=float)
+            ax.bar(labels, values, color=spec[part].get("color"))
+            ax.set_ylabel(spec[part].get("ylabel", ""))
+            if (target := spec[part].get("target")) is not None:
+                ax.axhline(target, color="gray", linestyle="dashed")
+    else:
+        raise ValueError(f"Unknown chart kind: {kind}")
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def chart_key(spec):
+    """Content address of a chart: the hash of its kind and input series."""
+    payload = json.dumps(spec, sort_keys=True, default=str)
+    return "chart:" + hashlib.sha256(payload.encode()).hexdigest()
+
+
+def render_charts(specs):
+    """Renders chart specs to PNG data URIs.
+
+    Charts already rendered for identical input are read from the cache;
+    only the misses are drawn, in this process. Reports are rendered in
+    parallel by fanning user chunks out across the Celery workers.
+    """
+    keys = [chart_key(spec) for spec in specs]
+    images = dict(zip(keys, cache.get_many(*keys)))
+    missing = {key: spec for key, spec in zip(keys, specs) if images[key] is None}
+    for key, spec in missing.items():
+        images[key] = _draw(spec)
+        cache.set(key, images[key], timeout=current_app.config["CHART_CACHE_TTL"])
+    return [
+        "data:image/png;base64," + base64.b64encode(images[key]).decode()
+        for key in keys
+    ]
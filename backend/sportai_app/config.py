@@ -18,6 +18,22 @@ class Config:
     CELERY_BEAT_SCHEDULER = os.environ.get("CELERY_BEAT_SCHEDULER")
     MAIL_SERVER = os.environ.get("MAIL_SERVER")
     MAIL_PORT = os.environ.get("MAIL_PORT")
-    MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS")
+    MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", "").lower() in ("1", "true", "yes")
     MAIL_USERNAME = b64decode(os.environ.get("MAIL_USERNAME")).decode("utf-8")
     MAIL_PASSWORD = b64decode(os.environ.get("MAIL_PASSWORD") + "==").decode("utf-8")
+    RISK_MODEL_DIR = os.environ.get("RISK_MODEL_DIR")
+    RISK_MODEL_VERSION = os.environ.get("RISK_MODEL_VERSION")
+    RISK_BATCH_MAX_ROWS = int(os.environ.get("RISK_BATCH_MAX_ROWS", 100000))
+    SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.92))
+    SEMANTIC_CACHE_TTL = int(os.environ.get("SEMANTIC_CACHE_TTL", 3600))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 256))
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 60))
+    HEALTH_BATCH_MAX_ROWS = int(os.environ.get("HEALTH_BATCH_MAX_ROWS", 5000))
+    HEALTH_MAX_CLOCK_SKEW = int(os.environ.get("HEALTH_MAX_CLOCK_SKEW", 3600))
+    ECG_MAX_SAMPLES = int(os.environ.get("ECG_MAX_SAMPLES", 1000000))
+    CHART_CACHE_TTL = int(os.environ.get("CHART_CACHE_TTL", 7 * 24 * 3600))
+    MAIL_BATCH_SIZE = int(os.environ.get("MAIL_BATCH_SIZE", 100))
+    MAIL_RATE_LIMIT = float(os.environ.get("MAIL_RATE_LIMIT", 10))
+    DAILY_MAIL_HOUR = int(os.environ.get("DAILY_MAIL_HOUR", 7))
+    WEEKLY_REPORT_WEEKDAY = int(os.environ.get("WEEKLY_REPORT_WEEKDAY", 0))
+    WEEKLY_REPORT_HOUR = int(os.environ.get("WEEKLY_REPORT_HOUR", 8))
@@ -19,6 +19,7 @@ from datetime import datetime, timezone, timedelta
 import jwt
 import os
 import re
+import uuid
 
 
 @main.route("/register", methods=["POST"])
@@ -90,6 +91,7 @@ def login():
         token = jwt.encode(
             {
                 "userid": user.userid,
+                "jti": uuid.uuid4().hex,
                 "exp": datetime.now(timezone.utc) + timedelta(days=1),
             },
             current_app.config["SECRET_KEY"],
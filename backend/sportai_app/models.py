@@ -2,8 +2,13 @@ import jwt
 from datetime import datetime, timedelta, timezone
 from flask import current_app
 from sportai_app import db, bcrypt, ist
-from sqlalchemy import CheckConstraint
-from sportai_app.utils import custom_sort
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import CheckConstraint, func, select, text, tuple_
+from sqlalchemy.orm import aliased, declared_attr
+
+
+# Users without a stated timezone get their mail on IST.
+IST_OFFSET = int(ist.utcoffset(None).total_seconds() // 60)
 
 
 class User(db.Model):
@@ -20,7 +25,16 @@ class User(db.Model):
         db.String(60), nullable=False, default="default_profile_picture.png"
     )
     authenticated = db.Column(db.Boolean, default=False)
-    health_records = db.relationship("Health", back_populates="user", lazy=True)
+    utc_offset = db.Column(db.Integer, nullable=False, default=IST_OFFSET)
+    version = db.Column(db.Integer, nullable=False)
+    health_records = db.relationship(
+        "Health",
+        back_populates="user",
+        lazy="dynamic",
+        order_by="Health.timestamp.desc()",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
 
     __table_args__ = (
         CheckConstraint(
@@ -43,6 +57,7 @@ class User(db.Model):
             name="check_password_format",
         ),
     )
+    __mapper_args__ = {"version_id_col": version}
 
     def __repr__(self):
         return f"User('{self.userid}', '{self.name}', '{self.username}', '{self.email}', '{self.password}', '{self.profile_picture}', '{self.authenticated}')"
@@ -69,6 +84,10 @@ class User(db.Model):
         self.profile_picture = profile_picture
         self.authenticated = authenticated
 
+    @property
+    def etag(self):
+        return f"{self.userid}-{self.version}"
+
     def get_reset_token(self, expires_sec=1800):
         secret_key = jwt.encode(
             {
@@ -104,18 +123,59 @@ class User(db.Model):
             "phone": self.phone,
             "gender": self.gender,
             "profile_picture": self.profile_picture,
+            "utc_offset": self.utc_offset,
         }
         if "health_records" in include_relationships:
-            dt["health_records"] = custom_sort(self.health_records)
+            dt["health_records"] = [record.to_dict() for record in self.health_records]
         return dt
 
 
+SPORT_DURATIONS = [
+    "running_duration",
+    "cycling_duration",
+    "skipping_duration",
+    "badminton_duration",
+    "basketball_duration",
+    "football_duration",
+    "swimming_duration",
+    "elliptical_duration",
+]
+
+
+# Mirrors the CHECK constraints on the health table.
+HEALTH_RANGES = {
+    "heartbeat": (40, 220),
+    "blood_pressure_systolic": (70, 200),
+    "blood_pressure_diastolic": (40, 130),
+    "hydration": (0, 100),
+    "sleep_hours": (0, 24),
+    "blood_oxygen": (0, 100),
+    "walking_steps": (0, None),
+}
+
+HEALTH_FIELDS = [
+    "heartbeat",
+    "blood_pressure_systolic",
+    "blood_pressure_diastolic",
+    "hydration",
+    "sleep_hours",
+    "blood_oxygen",
+    "ecg_reading",
+    "walking_steps",
+] + SPORT_DURATIONS
+
+
 class Health(db.Model):
     __tablename__ = "health"
     healthid = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    userid = db.Column(db.Integer, db.ForeignKey("user.userid"), nullable=False)
+    userid = db.Column(
+        db.Integer, db.ForeignKey("user.userid", ondelete="CASCADE"), nullable=False
+    )
     timestamp = db.Column(
-        db.DateTime, nullable=False, default=datetime.now(ist).replace(tzinfo=None)
+        db.DateTime,
+        primary_key=True,
+        nullable=False,
+        default=lambda: datetime.now(ist).replace(tzinfo=None),
     )
     heartbeat = db.Column(db.Integer)
     blood_pressure_systolic = db.Column(db.Integer)
@@ -148,6 +208,8 @@ class Health(db.Model):
         CheckConstraint("sleep_hours BETWEEN 0 AND 24", name="check_sleep"),
         CheckConstraint("blood_oxygen BETWEEN 0 AND 100", name="check_bo"),
         CheckConstraint("walking_steps >= 0", name="check_steps"),
+        db.Index("ix_health_userid_timestamp", "userid", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
     )
 
     def __init__(self, userid, **kwargs):
@@ -155,6 +217,102 @@ class Health(db.Model):
         for key, value in kwargs.items():
             setattr(self, key, value)
 
+    @staticmethod
+    def window(userid, start=None, end=None, limit=None, newest_first=True):
+        """Query for a user's records in [start, end), ordered and limited in
+        SQL so it runs as a range scan on ix_health_userid_timestamp."""
+        query = Health.query.filter(Health.userid == userid)
+        if start is not None:
+            query = query.filter(Health.timestamp >= start)
+        if end is not None:
+            query = query.filter(Health.timestamp < end)
+        order = Health.timestamp.desc() if newest_first else Health.timestamp.asc()
+        query = query.order_by(order)
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+
+    @staticmethod
+    def page(userid, fields, start=None, end=None, after=None, limit=50):
+        """Returns up to `limit` records newest first, holding only `fields`.
+
+        Paging is keyset-based on (timestamp, healthid): `after` is the
+        (timestamp, healthid) of the last record of the previous page, so
+        every page is an index range scan no matter how deep it is.
+        """
+        columns = [Health.healthid, Health.timestamp] + [
+            getattr(Health, field)
+            for field in fields
+            if field not in ("healthid", "timestamp")
+        ]
+        query = select(*columns).where(Health.userid == userid)
+        if start is not None:
+            query = query.where(Health.timestamp >= start)
+        if end is not None:
+            query = query.where(Health.timestamp < end)
+        if after is not None:
+            query = query.where(tuple_(Health.timestamp, Health.healthid) < after)
+        query = query.order_by(Health.timestamp.desc(), Health.healthid.desc())
+        return db.session.execute(query.limit(limit)).mappings().all()
+
+    @staticmethod
+    def last_days(userid, days=7):
+        start = datetime.now(ist).replace(tzinfo=None) - timedelta(days=days)
+        return Health.window(userid, start=start).all()
+
+    @staticmethod
+    def ensure_partitions(months_ahead=3):
+        """Creates the monthly partitions of the health table up to
+        `months_ahead` months from now, plus a default partition.
+
+        A month that already has rows in the default partition is created as
+        a standalone table, filled with those rows and then attached, since
+        PostgreSQL refuses to create a partition over rows the default
+        partition holds. The table itself is converted to a partitioned one
+        by migrations/001_partition_health.sql.
+        """
+        if db.engine.dialect.name != "postgresql":
+            return
+        today = datetime.now(ist).date()
+        year, month = today.year, today.month
+        with db.engine.begin() as connection:
+            connection.execute(
+                text(
+                    "CREATE TABLE IF NOT EXISTS health_default "
+                    "PARTITION OF health DEFAULT"
+                )
+            )
+            for _ in range(months_ahead + 1):
+                next_year, next_month = (
+                    (year + 1, 1) if month == 12 else (year, month + 1)
+                )
+                name = f"health_y{year}m{month:02d}"
+                start, end = f"{year}-{month:02d}-01", f"{next_year}-{next_month:02d}-01"
+                exists = connection.execute(
+                    text("SELECT to_regclass(:name)"), {"name": name}
+                ).scalar()
+                if exists is None:
+                    connection.execute(
+                        text(
+                            f"CREATE TABLE {name} "
+                            "(LIKE health INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+                        )
+                    )
+                    connection.execute(
+                        text(
+                            f"WITH moved AS (DELETE FROM health_default "
+                            f"WHERE timestamp >= '{start}' AND timestamp < '{end}' "
+                            f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+                        )
+                    )
+                    connection.execute(
+                        text(
+                            f"ALTER TABLE health ATTACH PARTITION {name} "
+                            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+                        )
+                    )
+                year, month = next_year, next_month
+
     def to_dict(self):
         return {
             "healthid": self.healthid,
@@ -182,17 +340,15 @@ class Health(db.Model):
 class BlacklistedToken(db.Model):
     __tablename__ = "blacklistedtoken"
     blacklistedid = db.Column(db.Integer, primary_key=True)
-    token = db.Column(db.String(512), unique=True, nullable=False)
-    expiry = db.Column(db.DateTime, nullable=False)
+    jti = db.Column(db.String(64), unique=True, nullable=False)
+    expiry = db.Column(db.DateTime, nullable=False, index=True)
 
-    def __init__(self, token, expiry):
-        self.token = token
+    def __init__(self, jti, expiry):
+        self.jti = jti
         self.expiry = expiry
 
     def __repr__(self):
-        return (
-            f"BlacklistedToken('{self.blacklistedid}', '{self.token}', '{self.expiry}')"
-        )
+        return f"BlacklistedToken('{self.blacklistedid}', '{self.jti}', '{self.expiry}')"
 
     def is_expired(self):
         return datetime.now(ist).replace(tzinfo=None) > self.expiry
@@ -200,6 +356,298 @@ class BlacklistedToken(db.Model):
     def to_dict(self):
         return {
             "blacklistedid": self.blacklistedid,
-            "token": self.token,
+            "jti": self.jti,
             "expiry": self.expiry.isoformat(),
         }
+
+
+class EcgStrip(db.Model):
+    __tablename__ = "ecgstrip"
+    ecgid = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    userid = db.Column(
+        db.Integer, db.ForeignKey("user.userid", ondelete="CASCADE"), nullable=False
+    )
+    recorded_at = db.Column(db.DateTime, nullable=False)
+    sample_rate = db.Column(db.Integer, nullable=False)
+    sample_count = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("sample_rate BETWEEN 1 AND 65535", name="check_sample_rate"),
+        db.Index("ix_ecgstrip_userid_recorded_at", "userid", "recorded_at"),
+    )
+
+    def __init__(self, userid, recorded_at, sample_rate, sample_count, data):
+        self.userid = userid
+        self.recorded_at = recorded_at
+        self.sample_rate = sample_rate
+        self.sample_count = sample_count
+        self.data = data
+
+    def __repr__(self):
+        return f"EcgStrip('{self.ecgid}', '{self.userid}', '{self.recorded_at}', '{self.sample_count}')"
+
+    def to_dict(self):
+        return {
+            "ecgid": self.ecgid,
+            "recorded_at": self.recorded_at.isoformat(),
+            "sample_rate": self.sample_rate,
+            "sample_count": self.sample_count,
+            "duration_seconds": round(self.sample_count / self.sample_rate, 2),
+        }
+
+
+# How long a watermark waits on a gap in the healthids before taking it to
+# be a rolled-back insert, a skipped sequence value or a deleted row rather
+# than a batch that has not committed yet.
+WATERMARK_GAP_TIMEOUT = timedelta(minutes=5)
+
+
+class PipelineState(db.Model):
+    __tablename__ = "pipelinestate"
+    name = db.Column(db.String(60), primary_key=True)
+    watermark = db.Column(db.Integer, nullable=False, default=0)
+    held_since = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+
+    def __init__(self, name, watermark=0):
+        self.name = name
+        self.watermark = watermark
+
+    def __repr__(self):
+        return f"PipelineState('{self.name}', '{self.watermark}', '{self.updated_at}')"
+
+    @staticmethod
+    def get(name):
+        state = db.session.get(PipelineState, name, with_for_update=True)
+        if state is None:
+            state = PipelineState(name)
+            db.session.add(state)
+        return state
+
+    @staticmethod
+    def _first_gap(floor, high):
+        """The lowest missing healthid in (floor, high], or None."""
+        first = db.session.scalar(
+            select(func.min(Health.healthid)).where(Health.healthid > floor)
+        )
+        if first is not None and first > floor + 1:
+            return floor + 1
+        following = aliased(Health)
+        return db.session.scalar(
+            select(func.min(Health.healthid) + 1).where(
+                Health.healthid > floor,
+                Health.healthid < high,
+                ~select(following.healthid)
+                .where(following.healthid == Health.healthid + 1)
+                .exists(),
+            )
+        )
+
+    def advance(self, high, timeout=WATERMARK_GAP_TIMEOUT):
+        """Moves the watermark up to `high`, but not past a fresh gap in the
+        healthids above it.
+
+        A healthid is allocated when its row is inserted but becomes visible
+        only when the transaction commits, so a gap may be a batch that
+        commits after this run. The watermark is held just below the gap,
+        and the next runs re-scan from there, until the gap fills or has been
+        waited on for `timeout`. The pipelines recompute whole (user, day)
+        groups, so the rows read twice do no harm.
+        """
+        now = datetime.now(ist).replace(tzinfo=None)
+        expired = self.held_since is not None and now - self.held_since > timeout
+        floor = self.watermark
+        while (gap := self._first_gap(floor, high)) is not None:
+            if gap == self.watermark + 1 and expired:
+                # Skip the whole stale gap, up to the next existing row.
+                floor = db.session.scalar(
+                    select(func.min(Health.healthid)).where(Health.healthid > gap)
+                ) - 1
+                continue
+            if gap - 1 != self.watermark or expired:
+                self.held_since = now
+            self.watermark = gap - 1
+            break
+        else:
+            self.watermark = high
+            self.held_since = None
+        self.updated_at = now
+
+
+class MailLedger(db.Model):
+    __tablename__ = "mailledger"
+    mailledgerid = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    userid = db.Column(
+        db.Integer, db.ForeignKey("user.userid", ondelete="CASCADE"), nullable=False
+    )
+    mail_type = db.Column(db.String(20), nullable=False)
+    period = db.Column(db.String(10), nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "userid", "mail_type", "period", name="uq_mailledger_userid_type_period"
+        ),
+    )
+
+    def __repr__(self):
+        return f"MailLedger('{self.userid}', '{self.mail_type}', '{self.period}')"
+
+    @staticmethod
+    def claim(mail_type, period, userids):
+        """Records a send of `mail_type` for `period` to each user and returns
+        the userids that were not already recorded, so that concurrent or
+        repeated runs never mail the same user twice."""
+        if not userids:
+            return set()
+        now = datetime.now(ist)
+        stmt = (
+            insert(MailLedger)
+            .values(
+                [
+                    {"userid": userid, "mail_type": mail_type, "period": period, "sent_at": now}
+                    for userid in userids
+                ]
+            )
+            .on_conflict_do_nothing(constraint="uq_mailledger_userid_type_period")
+            .returning(MailLedger.userid)
+        )
+        claimed = set(db.session.scalars(stmt))
+        db.session.commit()
+        return claimed
+
+    @staticmethod
+    def release(mail_type, period, userids):
+        """Forgets the sends that failed so the next run retries them."""
+        if userids:
+            db.session.execute(
+                db.delete(MailLedger).where(
+                    MailLedger.mail_type == mail_type,
+                    MailLedger.period == period,
+                    MailLedger.userid.in_(userids),
+                )
+            )
+            db.session.commit()
+
+    @staticmethod
+    def unsent(mail_type, period):
+        """Filter for the users not yet sent `mail_type` for `period`."""
+        return ~db.exists().where(
+            MailLedger.userid == User.userid,
+            MailLedger.mail_type == mail_type,
+            MailLedger.period == period,
+        )
+
+
+class DailyRisk(db.Model):
+    __tablename__ = "dailyrisk"
+    dailyriskid = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    userid = db.Column(
+        db.Integer, db.ForeignKey("user.userid", ondelete="CASCADE"), nullable=False
+    )
+    date = db.Column(db.Date, nullable=False)
+    training_load = db.Column(db.Float)
+    hrv = db.Column(db.Float)
+    acceleration = db.Column(db.Float)
+    previous_injury = db.Column(db.Float)
+    sleep_hours = db.Column(db.Float)
+    hydration_level = db.Column(db.Float)
+    fatigue_score = db.Column(db.Float)
+    risk = db.Column(db.Integer, nullable=False)
+    probabilities = db.Column(db.JSON)
+    model_version = db.Column(db.String(20))
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint("userid", "date", name="uq_dailyrisk_userid_date"),
+    )
+
+    def __repr__(self):
+        return f"DailyRisk('{self.userid}', '{self.date}', '{self.risk}')"
+
+    def to_dict(self):
+        return {
+            "date": self.date.isoformat(),
+            "training_load": self.training_load,
+            "hrv": self.hrv,
+            "acceleration": self.acceleration,
+            "previous_injury": self.previous_injury,
+            "sleep_hours": self.sleep_hours,
+            "hydration_level": self.hydration_level,
+            "fatigue_score": self.fatigue_score,
+            "risk": self.risk,
+            "probabilities": self.probabilities,
+            "model_version": self.model_version,
+            "computed_at": self.computed_at.isoformat(),
+        }
+
+
+class HealthRollupMixin:
+    @declared_attr
+    def userid(cls):
+        return db.Column(
+            db.Integer, db.ForeignKey("user.userid", ondelete="CASCADE"), nullable=False
+        )
+
+    readings = db.Column(db.Integer, nullable=False, default=0)
+    heartbeat_sum = db.Column(db.Float)
+    heartbeat_count = db.Column(db.Integer)
+    sleep_hours_sum = db.Column(db.Float)
+    sleep_hours_count = db.Column(db.Integer)
+    hydration_sum = db.Column(db.Float)
+    hydration_count = db.Column(db.Integer)
+    walking_steps = db.Column(db.BigInteger)
+    running_duration = db.Column(db.BigInteger)
+    cycling_duration = db.Column(db.BigInteger)
+    skipping_duration = db.Column(db.BigInteger)
+    badminton_duration = db.Column(db.BigInteger)
+    basketball_duration = db.Column(db.BigInteger)
+    football_duration = db.Column(db.BigInteger)
+    swimming_duration = db.Column(db.BigInteger)
+    elliptical_duration = db.Column(db.BigInteger)
+    updated_at = db.Column(db.DateTime)
+
+    @staticmethod
+    def _average(total, count):
+        return round(total / count, 2) if count else None
+
+    def to_dict(self):
+        return {
+            "readings": self.readings,
+            "average_heartbeat": self._average(self.heartbeat_sum, self.heartbeat_count),
+            "average_sleep_hours": self._average(
+                self.sleep_hours_sum, self.sleep_hours_count
+            ),
+            "average_hydration": self._average(self.hydration_sum, self.hydration_count),
+            "walking_steps": self.walking_steps,
+            **{column: getattr(self, column) for column in SPORT_DURATIONS},
+        }
+
+
+class HealthDailyRollup(HealthRollupMixin, db.Model):
+    __tablename__ = "healthdailyrollup"
+    rollupid = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    day = db.Column(db.Date, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint("userid", "day", name="uq_healthdailyrollup_userid_day"),
+    )
+
+    def to_dict(self):
+        return {"day": self.day.isoformat(), **super().to_dict()}
+
+
+class HealthWeeklyRollup(HealthRollupMixin, db.Model):
+    __tablename__ = "healthweeklyrollup"
+    rollupid = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    week_start = db.Column(db.Date, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "userid", "week_start", name="uq_healthweeklyrollup_userid_week_start"
+        ),
+    )
+
+    def to_dict(self):
+        return {"week_start": self.week_start.isoformat(), **super().to_dict()}
@@ -1,16 +1,120 @@
-from datetime import datetime
+from datetime import date, datetime
 from celery import shared_task
-from sportai_app.utils import send_daily_mail, send_report_mail
+from celery.signals import worker_ready
+from sportai_app.utils import (
+    send_daily_mail,
+    send_mail_once,
+    report_message,
+    due_buckets,
+    delete_expired_tokens,
+    report_week,
+    build_report,
+)
 
 
 @shared_task(ignore_result=True)
 def daily_mail():
-    send_daily_mail()
+    unsent = send_daily_mail()
+    return f"{len(unsent)} unsent"
+
+
+@shared_task(ignore_result=True)
+def weekly_report(chunk_size=50):
+    """Fans last week's reports out to the workers, one subtask per chunk of
+    `chunk_size` users, for the timezone buckets past their weekly send time
+    that have not been sent the report yet."""
+    from flask import current_app
+    from sportai_app import db
+    from sportai_app.models import User, HealthWeeklyRollup, MailLedger
+
+    queued = 0
+    buckets = due_buckets(
+        current_app.config["WEEKLY_REPORT_HOUR"],
+        current_app.config["WEEKLY_REPORT_WEEKDAY"],
+    )
+    for offset, today in buckets.items():
+        week_start, _ = report_week(today)
+        userids = db.session.scalars(
+            db.select(HealthWeeklyRollup.userid)
+            .join(User, User.userid == HealthWeeklyRollup.userid)
+            .where(
+                HealthWeeklyRollup.week_start == week_start,
+                User.utc_offset == offset,
+                MailLedger.unsent("weekly", week_start.isoformat()),
+            )
+        ).all()
+        for start in range(0, len(userids), chunk_size):
+            user_reports.delay(userids[start : start + chunk_size], week_start.isoformat())
+        queued += len(userids)
+    return queued
+
+
+@shared_task(ignore_result=True)
+def user_reports(userids, week_start):
+    """Renders the report of each user in the chunk not yet sent this week's
+    report, then mails them over one connection."""
+    from sportai_app import db
+    from sportai_app.models import User, MailLedger
+
+    userids = db.session.scalars(
+        db.select(User.userid).where(
+            User.userid.in_(userids), MailLedger.unsent("weekly", week_start)
+        )
+    ).all()
+    week = date.fromisoformat(week_start)
+    messages = {}
+    for userid in userids:
+        if report := build_report(userid, week):
+            user, pdf = report
+            messages[userid] = report_message(user, pdf, week)
+    unsent = send_mail_once("weekly", week_start, messages)
+    return f"{len(unsent)} unsent"
+
+
+@shared_task(ignore_result=True)
+def delete_blacklisted_tokens(batch_size=1000):
+    return delete_expired_tokens(batch_size)
+
+
+@shared_task(ignore_result=True)
+def daily_risk():
+    from sportai_app.user.risk.daily_risk import compute_daily_risk
+
+    return compute_daily_risk()
+
+
+@shared_task(ignore_result=True)
+def user_corpora():
+    from sportai_app.user.rag.user_corpus import refresh_user_corpora
+
+    return refresh_user_corpora()
+
+
+@shared_task(ignore_result=True)
+def user_corpus(userid):
+    from sportai_app.user.rag.user_corpus import refresh_user_corpus
+
+    refresh_user_corpus(userid, days=())
     return "OK"
 
 
 @shared_task(ignore_result=True)
-def weekly_report():
-    send_report_mail()
+def health_partitions(months_ahead=3):
+    from sportai_app.models import Health
+
+    Health.ensure_partitions(months_ahead)
     return "OK"
 
+
+@worker_ready.connect
+def queue_health_partitions(**kwargs):
+    """Creates the upcoming partitions once when a worker starts, so a fresh
+    database does not wait for the nightly run to accept readings."""
+    health_partitions.delay()
+
+
+@shared_task(ignore_result=True)
+def health_rollups():
+    from sportai_app.user.rollups import refresh_rollups
+
+    return refresh_rollups()
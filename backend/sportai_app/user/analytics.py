@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from sportai_app import db, ist
+from sportai_app.models import Health, HEALTH_FIELDS, SPORT_DURATIONS
+
+DTYPES = {
+    "heartbeat": "Int16",
+    "blood_pressure_systolic": "Int16",
+    "blood_pressure_diastolic": "Int16",
+    "hydration": "float32",
+    "sleep_hours": "float32",
+    "blood_oxygen": "float32",
+    "walking_steps": "Int32",
+    **{column: "Int32" for column in SPORT_DURATIONS},
+}
+NUMERIC_FIELDS = [field for field in HEALTH_FIELDS if field != "ecg_reading"]
+
+SLEEP_TARGET_HOURS = 8
+
+
+def load_health_frame(userid, days=56, columns=NUMERIC_FIELDS):
+    """Loads a user's Health window straight from SQL into a DataFrame
+    indexed by timestamp, with explicit nullable dtypes."""
+    start = datetime.now(ist).replace(tzinfo=None) - timedelta(days=days)
+    query = (
+        db.select(Health.timestamp, *[getattr(Health, column) for column in columns])
+        .where(Health.userid == userid, Health.timestamp >= start)
+        .order_by(Health.timestamp)
+    )
+    with db.engine.connect() as connection:
+        df = pd.read_sql(
+            query,
+            connection,
+            index_col="timestamp",
+            parse_dates=["timestamp"],
+            dtype={column: DTYPES[column] for column in columns},
+        )
+    return df
+
+
+def daily_frame(df):
+    """Collapses readings to one row per calendar day, filling days without
+    readings so rolling windows count calendar days rather than rows."""
+    daily = pd.DataFrame(
+        {
+            "training_load": df[SPORT_DURATIONS].fillna(0).sum(axis=1).astype(float),
+            "heartbeat": df["heartbeat"].astype(float),
+            "sleep_hours": df["sleep_hours"].astype(float),
+            "hydration": df["hydration"].astype(float),
+        },
+        index=df.index,
+    ).resample("D")
+    daily = pd.DataFrame(
+        {
+            "training_load": daily["training_load"].sum(),
+            "heartbeat": daily["heartbeat"].mean(),
+            "heartbeat_std": daily["heartbeat"].std(),
+            "sleep_hours": daily["sleep_hours"].max(),
+            "hydration": daily["hydration"].mean(),
+        }
+    )
+    return daily
+
+
+def workload_metrics(daily):
+    """Adds rolling metrics, all computed as vectorized column operations.
+
+    - acute/chronic load: 7- and 28-day rolling mean of daily training load,
+      and their ratio (ACWR)
+    - hrv_proxy: day-to-day heart-rate variability, as the 7-day mean of the
+      within-day heartbeat standard deviation
+    - resting_trend: 7-day change in the mean heartbeat
+    - sleep_debt: 7-day sum of the shortfall against SLEEP_TARGET_HOURS
+    """
+    out = daily.copy()
+    out["acute_load"] = daily["training_load"].rolling(7, min_periods=1).mean()
+    out["chronic_load"] = daily["training_load"].rolling(28, min_periods=7).mean()
+    out["acwr"] = out["acute_load"] / out["chronic_load"].replace(0, np.nan)
+    out["hrv_proxy"] = daily["heartbeat_std"].rolling(7, min_periods=1).mean()
+    out["resting_trend"] = daily["heartbeat"].rolling(7, min_periods=1).mean().diff(7)
+    shortfall = (SLEEP_TARGET_HOURS - daily["sleep_hours"]).clip(lower=0)
+    out["sleep_debt"] = shortfall.rolling(7, min_periods=1).sum()
+    return out
+
+
+def user_metrics(userid, days=28):
+    """Daily workload metrics of the last `days` days, as JSON-ready records.
+
+    28 extra days are loaded so the chronic window is full from day one.
+    """
+    df = load_health_frame(userid, days=days + 28)
+    if df.empty:
+        return []
+    metrics = workload_metrics(daily_frame(df)).tail(days).round(3)
+    metrics = metrics.astype(object).where(metrics.notna(), None)
+    metrics.index = metrics.index.date.astype(str)
+    return metrics.reset_index(names="date").to_dict("records")
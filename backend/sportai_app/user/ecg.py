@@ -0,0 +1,60 @@
+import zlib
+import struct
+import numpy as np
+
+MAGIC = b"ECG1"
+HEADER = struct.Struct("<4sBHI")
+RAW = 0
+DELTA_ZLIB = 1
+
+
+def encode(samples, sample_rate, compress=True):
+    """Packs int16 samples behind a small header.
+
+    With `compress`, samples are delta-encoded (wrapping in int16, which
+    decodes exactly) and deflated; ECG deltas are small, so this is far
+    smaller than the raw array.
+    """
+    samples = np.asarray(samples, dtype="<i2")
+    if compress:
+        deltas = np.diff(samples, prepend=np.int16(0)).astype("<i2")
+        body, flags = zlib.compress(deltas.tobytes(), 6), DELTA_ZLIB
+    else:
+        body, flags = samples.tobytes(), RAW
+    return HEADER.pack(MAGIC, flags, sample_rate, len(samples)) + body
+
+
+def decode(blob):
+    magic, flags, sample_rate, count = HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("Not an encoded ECG strip.")
+    body = blob[HEADER.size :]
+    if flags == DELTA_ZLIB:
+        deltas = np.frombuffer(zlib.decompress(body), dtype="<i2")
+        samples = np.cumsum(deltas, dtype="<i2")
+    else:
+        samples = np.frombuffer(body, dtype="<i2")
+    if len(samples) != count:
+        raise ValueError("ECG strip is truncated.")
+    return samples, sample_rate
+
+
+def downsample(samples, points):
+    """Reduces a strip to about `points` samples for previews.
+
+    Each bucket contributes its minimum and maximum in time order, so the
+    QRS spikes survive where plain decimation would skip them.
+    """
+    buckets = max(points // 2, 1)
+    if len(samples) <= points:
+        return samples
+    size = len(samples) // buckets
+    trimmed = samples[: size * buckets].reshape(buckets, size)
+    low, high = trimmed.argmin(axis=1), trimmed.argmax(axis=1)
+    first = np.minimum(low, high)
+    second = np.maximum(low, high)
+    rows = np.arange(buckets)
+    out = np.empty(buckets * 2, dtype=samples.dtype)
+    out[0::2] = trimmed[rows, first]
+    out[1::2] = trimmed[rows, second]
+    return out
@@ -1,6 +1,21 @@
 from flask_wtf import FlaskForm
-from wtforms import PasswordField, RadioField, StringField, ValidationError, DateField
-from wtforms.validators import DataRequired, Length, EqualTo, AnyOf
+from wtforms import (
+    PasswordField,
+    RadioField,
+    StringField,
+    ValidationError,
+    DateField,
+    FloatField,
+    IntegerField,
+)
+from wtforms.validators import (
+    DataRequired,
+    Length,
+    EqualTo,
+    AnyOf,
+    NumberRange,
+    Optional,
+)
 from datetime import datetime
 import re
 from sportai_app.models import User
@@ -28,6 +43,10 @@ class UpdateProfileForm(FlaskForm):
         "Date of Birth",
         validators=[DataRequired()],
     )
+    utc_offset = IntegerField(
+        "UTC Offset (minutes)",
+        validators=[Optional(), NumberRange(min=-720, max=840)],
+    )
     password = PasswordField(
         "Enter Your Password To Update",
         validators=[DataRequired(), Length(min=8, max=60)],
@@ -115,3 +134,22 @@ class ChatForm(FlaskForm):
         csrf = False
     
     query = StringField("Query", validators=[DataRequired()])
+
+
+class RiskForm(FlaskForm):
+    class Meta:
+        csrf = False
+
+    training_load = FloatField("Training Load", validators=[NumberRange(min=0)])
+    hrv = FloatField("HRV (ms)", validators=[NumberRange(min=0)])
+    acceleration = FloatField("Acceleration (m/s²)", validators=[NumberRange(min=0)])
+    previous_injury = IntegerField(
+        "Previous Injury (1 for Yes, 0 for No)", validators=[NumberRange(min=0, max=1)]
+    )
+    sleep_hours = FloatField("Sleep Hours", validators=[NumberRange(min=0, max=24)])
+    hydration_level = FloatField(
+        "Hydration Level (%)", validators=[NumberRange(min=0, max=100)]
+    )
+    fatigue_score = IntegerField(
+        "Fatigue Score (1-10)", validators=[NumberRange(min=1, max=10)]
+    )
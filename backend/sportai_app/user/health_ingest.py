@@ -0,0 +1,104 @@
+import json
+from datetime import datetime, timedelta
+import pandas as pd
+from sqlalchemy import insert
+from flask import current_app
+from sportai_app import db, ist
+from sportai_app.models import Health, HEALTH_FIELDS, HEALTH_RANGES
+
+INTEGER_FIELDS = {
+    column.name
+    for column in Health.__table__.columns
+    if column.name in HEALTH_FIELDS and isinstance(column.type, db.Integer)
+}
+NUMERIC_FIELDS = [field for field in HEALTH_FIELDS if field != "ecg_reading"]
+ECG_MAX_LENGTH = Health.__table__.c.ecg_reading.type.length
+
+
+def parse_rows(body, ndjson=False):
+    """Parses a JSON array or newline-delimited JSON objects into a list."""
+    if ndjson:
+        rows = [json.loads(line) for line in body.splitlines() if line.strip()]
+    else:
+        rows = json.loads(body)
+        if not isinstance(rows, list):
+            raise ValueError("Request body must be a JSON array.")
+    if not all(isinstance(row, dict) for row in rows):
+        raise ValueError("Each row must be a JSON object.")
+    return rows
+
+
+def validate_rows(rows):
+    """Validates all rows column by column and returns the frame of valid
+    rows plus a list of {"row", "error"} rejects.
+
+    The ranges are the table's CHECK constraints, so valid rows will not be
+    refused by the database halfway through the batch.
+    """
+    df = pd.DataFrame(rows)
+    unknown = set(df.columns) - set(HEALTH_FIELDS) - {"timestamp"}
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    errors = pd.Series("", index=df.index, dtype=object)
+
+    def reject(mask, message):
+        errors[mask & (errors == "")] = message
+
+    now = datetime.now(ist).replace(tzinfo=None)
+    if "timestamp" in df.columns:
+        # ISO 8601 throughout, rather than a format inferred from the first
+        # row. Timestamps with an offset are converted to IST; naive ones
+        # already are IST wall time, like the rest of the table.
+        raw = df["timestamp"].astype("string")
+        timestamps = pd.to_datetime(
+            df["timestamp"], format="ISO8601", errors="coerce", utc=True
+        )
+        naive = ~raw.str.contains(r"(?:Z|[+-]\d{2}:?\d{2})$", na=False)
+        timestamps = timestamps.where(~naive, timestamps - ist.utcoffset(None))
+        timestamps = timestamps.dt.tz_convert(ist).dt.tz_localize(None)
+        reject(timestamps.isna() & df["timestamp"].notna(), "Invalid timestamp")
+        # Future readings would land in the default partition and block the
+        # creation of their month's partition.
+        skew = timedelta(seconds=current_app.config["HEALTH_MAX_CLOCK_SKEW"])
+        reject(timestamps > now + skew, "Timestamp is in the future")
+        df["timestamp"] = timestamps.fillna(now)
+    else:
+        df["timestamp"] = now
+
+    for field in NUMERIC_FIELDS:
+        if field not in df.columns:
+            continue
+        provided = df[field].notna()
+        values = pd.to_numeric(df[field], errors="coerce")
+        reject(provided & values.isna(), f"{field} must be a number")
+        if field in INTEGER_FIELDS:
+            reject(values.notna() & (values % 1 != 0), f"{field} must be an integer")
+        low, high = HEALTH_RANGES.get(field, (0, None))
+        out_of_range = values < low
+        if high is not None:
+            out_of_range |= values > high
+        reject(out_of_range, f"{field} is out of range")
+        df[field] = values
+
+    if "ecg_reading" in df.columns:
+        lengths = df["ecg_reading"].astype("string").str.len()
+        reject(lengths > ECG_MAX_LENGTH, "ecg_reading is too long")
+
+    rejected = [
+        {"row": int(i), "error": error} for i, error in errors.items() if error
+    ]
+    return df[(errors == "").to_numpy()], rejected
+
+
+def insert_rows(userid, df):
+    """Inserts all rows with one multi-row Core INSERT in a single transaction."""
+    if df.empty:
+        return 0
+    df = df.assign(userid=userid)
+    for field in INTEGER_FIELDS & set(df.columns):
+        df[field] = df[field].astype("Int64")
+    records = df.astype(object).where(df.notna(), None).to_dict("records")
+    db.session.execute(insert(Health), records)
+    db.session.commit()
+    return len(records)
@@ -1,10 +1,14 @@
-from .qa_chain import create_qa_chain
-from .gemini_api import query_gemini, reset_chat, get_chat_history
+from .qa_chain import create_qa_chain, get_qa_chain, answer_query, stream_answer
+from .gemini_api import query_gemini, stream_gemini, reset_chat, get_chat_history
 from .gemini_llm import GeminiLLM
 
 __all__ = [
     "create_qa_chain",
+    "get_qa_chain",
+    "answer_query",
+    "stream_answer",
     "query_gemini",
+    "stream_gemini",
     "reset_chat",
     "get_chat_history",
     "GeminiLLM",
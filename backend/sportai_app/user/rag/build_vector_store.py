@@ -1,18 +1,14 @@
 # build_vector_store.py
-import pickle
-from langchain.vectorstores import FAISS
-from langchain.embeddings import HuggingFaceEmbeddings
+import sys
 from data_loader import load_athlete_data
+from vector_store import ATHLETE_INDEX_DIR, read_meta, update_index
 
-def build_faiss_index():
-    """Builds a FAISS index from the athlete data and saves it to a file."""
+def build_faiss_index(index_dir=ATHLETE_INDEX_DIR):
+    """Builds or incrementally updates the FAISS index of the athlete data."""
     docs = load_athlete_data()
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vector_store = FAISS.from_documents(docs, embeddings)
-    
-    with open("vectorstore.pkl", "wb") as f:
-        pickle.dump(vector_store, f)
-    print("FAISS index built and saved as 'vectorstore.pkl'.")
+    update_index(index_dir, docs)
+    meta = read_meta(index_dir)
+    print(f"FAISS index version {meta['version']} with {len(meta['chunks'])} chunks saved to '{index_dir}'.")
 
 if __name__ == "__main__":
-    build_faiss_index()
+    build_faiss_index(*sys.argv[1:])
@@ -1,16 +1,37 @@
 # data_loader.py
+import os
 from langchain.text_splitter import CharacterTextSplitter
 from langchain.docstore.document import Document
 
-def load_athlete_data(file_path="athlete_data.txt"):
+current_dir = os.path.dirname(os.path.abspath(__file__))
+ATHLETE_DATA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(current_dir)), "static", "data", "athlete_data.txt"
+)
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+
+def split_text(text, metadata=None):
+    """Splits text into chunks with the chunking every index is built with."""
+    text_splitter = CharacterTextSplitter(
+        separator="\n",
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+    )
+    chunks = text_splitter.split_text(text)
+
+    return [Document(page_content=chunk, metadata=dict(metadata or {})) for chunk in chunks]
+
+
+def load_athlete_data(file_path=ATHLETE_DATA_PATH):
     """Reads and splits athlete-related data into smaller chunks."""
     with open(file_path, "r", encoding="utf-8") as file:
         text = file.read()
 
-    text_splitter = CharacterTextSplitter(chunk_size=200, chunk_overlap=20)
-    chunks = text_splitter.split_text(text)
-    
-    return [Document(page_content=chunk) for chunk in chunks]
+    return split_text(text, {"source": os.path.basename(file_path)})
+
 
 if __name__ == "__main__":
     docs = load_athlete_data()
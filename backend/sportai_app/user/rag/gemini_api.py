@@ -1,35 +1,19 @@
-import google.generativeai as genai
 import os
+import time
+import threading
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
+from .llm_gateway import get_gateway
 
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
 
-_chat_session = None
-_chat_history = []
+GEMINI_MODEL = "gemini-2.0-flash-exp"
+MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", 1000))
+SESSION_TTL = int(os.getenv("CHAT_SESSION_TTL", 1800))
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKENS", 2000))
+MAX_HISTORY_MESSAGES = 40
 
-def query_gemini(prompt):
-    try:
-        return _extracted_from_query_gemini_7(prompt)
-    except Exception as e:
-        _chat_session = None
-        _chat_history = []
-        return f"❌ API Error: {e}"
-
-def _extracted_from_query_gemini_7(prompt):
-    global _chat_session, _chat_history
-    model = genai.GenerativeModel('gemini-2.0-flash-exp')
-
-    safety_settings = {
-        "HARASSMENT": "block_none",
-        "HATE_SPEECH": "block_none",
-        "SEXUALLY_EXPLICIT": "block_none",
-        "DANGEROUS_CONTENT": "block_none",
-    }
-
-    if _chat_session is None:
-        system_prompt = """You are a professional and caring AI fitness coach that has access to athlete's data.
+SYSTEM_PROMPT = """You are a professional and caring AI fitness coach that has access to athlete's data.
 - When someone asks questions, provide advice based on analyzing athlete_data.txt file's data as a reference
 - Never assume the user is someone mentioend in the context file - they are asking about his fitness regime and data
 - Start responses with phrases like "Based on the data..." or "Looking at the athlete's profile..."
@@ -38,24 +22,139 @@ def _extracted_from_query_gemini_7(prompt):
 - If something is unclear, ask for clarification
 - For general greetings, respond professionally without assuming anything about the user"""
 
-        _chat_session = model.start_chat(history=[])
-        _chat_history = []
-        _chat_session.send_message(system_prompt)
 
-    _chat_history.append({"role": "user", "content": prompt})
+class GeminiError(Exception):
+    """Raised by stream_gemini when Gemini fails, possibly after part of the
+    answer was already yielded, so callers can tell a broken answer apart."""
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+class ChatSession:
+    __slots__ = ("history", "last_used")
+
+    def __init__(self):
+        self.history = deque(maxlen=MAX_HISTORY_MESSAGES)
+        self.last_used = time.monotonic()
+
+    def window(self, budget=HISTORY_TOKEN_BUDGET):
+        """Returns the most recent messages that fit in `budget` tokens."""
+        messages = []
+        for message in reversed(self.history):
+            budget -= estimate_tokens(message["content"])
+            if budget < 0:
+                break
+            messages.append(message)
+        return messages[::-1]
+
+
+class ChatSessionStore:
+    """Chat sessions keyed by userid with LRU and idle-TTL eviction."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            while self._sessions:
+                oldest_key, oldest = next(iter(self._sessions.items()))
+                if now - oldest.last_used <= self.ttl:
+                    break
+                del self._sessions[oldest_key]
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = ChatSession()
+            session.last_used = now
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def reset(self, key):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def history(self, key):
+        with self._lock:
+            session = self._sessions.get(key)
+            return list(session.history) if session else []
 
-    response = _chat_session.send_message(prompt)
 
-    _chat_history.append({"role": "assistant", "content": response.text})
+_sessions = ChatSessionStore()
 
-    return response.text
 
-def reset_chat():
-    global _chat_session, _chat_history
-    _chat_session = None
-    _chat_history = []
+def to_payload(messages):
+    return {
+        "systemInstruction": {"parts": [{"text": SYSTEM_PROMPT}]},
+        "contents": [
+            {
+                "role": "model" if message["role"] == "assistant" else "user",
+                "parts": [{"text": message["content"]}],
+            }
+            for message in messages
+        ],
+    }
+
+
+def query_gemini(prompt, userid=None, question=None):
+    """Answers `prompt` within the user's chat session.
+
+    `prompt` may carry retrieved context for this turn only; the history
+    keeps `question`, the user's own words, so old context is not re-sent
+    and does not crowd earlier turns out of the token budget.
+    """
+    session = _sessions.get(userid)
+    try:
+        payload = to_payload(session.window() + [{"role": "user", "content": prompt}])
+        text = get_gateway(GEMINI_MODEL).generate(payload)
+    except Exception as e:
+        _sessions.reset(userid)
+        return f"❌ API Error: {e}"
+
+    session.history.append({"role": "user", "content": question or prompt})
+    session.history.append({"role": "assistant", "content": text})
+    return text
+
+
+def stream_gemini(prompt, userid=None, question=None):
+    """Yields the answer to `prompt` chunk by chunk as Gemini produces it.
+
+    Like query_gemini, only `question` is kept in the history. Raises
+    GeminiError if the request fails, even midway through.
+    """
+    session = _sessions.get(userid)
+    parts = []
+    try:
+        payload = to_payload(session.window() + [{"role": "user", "content": prompt}])
+        for text in get_gateway(GEMINI_MODEL).stream(payload):
+            parts.append(text)
+            yield text
+    except Exception as e:
+        _sessions.reset(userid)
+        raise GeminiError(f"❌ API Error: {e}") from e
+
+    session.history.append({"role": "user", "content": question or prompt})
+    session.history.append({"role": "assistant", "content": "".join(parts)})
+
+
+def record_turn(userid, question, answer):
+    """Adds an exchange answered without calling Gemini, such as a cached
+    answer, to the user's history so follow-ups can refer to it."""
+    session = _sessions.get(userid)
+    session.history.append({"role": "user", "content": question})
+    session.history.append({"role": "assistant", "content": answer})
+
+
+def reset_chat(userid=None):
+    _sessions.reset(userid)
     return {"message": "Chat history cleared", "history": []}
 
-def get_chat_history():
-    global _chat_history
-    return _chat_history
+
+def get_chat_history(userid=None):
+    return _sessions.history(userid)
@@ -1,20 +1,44 @@
 from langchain.llms.base import LLM
-from typing import Optional, List
-from .gemini_api import query_gemini
+from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.schema.output import GenerationChunk
+from typing import Any, Iterator, Optional, List
+from .gemini_api import query_gemini, stream_gemini
 
 
 class GeminiLLM(LLM):
-    def __init__(self, callbacks=None):
-        super().__init__()
+    userid: Optional[int] = None
+
+    def __init__(self, callbacks=None, userid=None):
+        super().__init__(userid=userid)
         self.callbacks = callbacks
 
     @property
     def _llm_type(self) -> str:
         return "gemini"
 
-    def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
-        return query_gemini(prompt)
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        question: Optional[str] = None,
+        **kwargs: Any,
+    ) -> str:
+        return query_gemini(prompt, self.userid, question)
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        question: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        for text in stream_gemini(prompt, self.userid, question):
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
 
     @property
     def _identifying_params(self) -> dict:
-        return {}
+        return {"userid": self.userid}
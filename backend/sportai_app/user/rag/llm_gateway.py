@@ -0,0 +1,195 @@
+import os
+import json
+import queue
+import random
+import asyncio
+import hashlib
+import threading
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:{method}"
+
+
+class RetryableError(Exception):
+    pass
+
+
+class GeminiBackend:
+    """Calls the Gemini REST API over a shared, connection-pooled client."""
+
+    def __init__(self, model, api_key=None):
+        self.model = model
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+
+    def _request(self, method):
+        return {
+            "url": GEMINI_URL.format(model=self.model, method=method),
+            "headers": {"x-goog-api-key": self.api_key},
+        }
+
+    @staticmethod
+    def _text(data):
+        candidates = data.get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+    @staticmethod
+    def _check(response):
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RetryableError(f"Gemini returned {response.status_code}")
+        response.raise_for_status()
+
+    async def generate(self, client, payload):
+        response = await client.post(json=payload, **self._request("generateContent"))
+        self._check(response)
+        return self._text(response.json())
+
+    async def stream(self, client, payload):
+        request = self._request("streamGenerateContent")
+        async with client.stream(
+            "POST", request["url"] + "?alt=sse", headers=request["headers"], json=payload
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                self._check(response)
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    if text := self._text(json.loads(line[len("data: ") :])):
+                        yield text
+
+
+class StubBackend:
+    """Deterministic offline stand-in for Gemini, used when LLM_BACKEND=stub."""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+
+    def _words(self, payload):
+        prompt = payload["contents"][-1]["parts"][0]["text"]
+        text = (
+            "Based on the data, here is a test answer to a "
+            f"{len(prompt) // 4 + 1} token prompt."
+        )
+        return [word + " " for word in text.split(" ")]
+
+    async def generate(self, client, payload):
+        await asyncio.sleep(self.delay)
+        return "".join(self._words(payload))
+
+    async def stream(self, client, payload):
+        for word in self._words(payload):
+            await asyncio.sleep(self.delay)
+            yield word
+
+
+class LLMGateway:
+    """Runs LLM calls on a private asyncio loop so blocking callers share one
+    pooled HTTP client.
+
+    Calls are capped by a semaphore, time out, are retried with exponential
+    backoff on timeouts, transport errors, 429s and 5xx responses, and
+    identical prompts already in flight are coalesced into a single call.
+
+    This pools connections and bounds concurrency only: the calling WSGI
+    thread still waits for the whole call (or stream) to finish.
+    """
+
+    def __init__(self, backend, max_concurrency=32, timeout=30, retries=2, backoff=0.5):
+        self.backend = backend
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pid = os.getpid()
+        self._inflight = {}
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+
+        async def setup():
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+            self._client = httpx.AsyncClient(
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=max_concurrency,
+                    max_keepalive_connections=max_concurrency,
+                ),
+            )
+
+        asyncio.run_coroutine_threadsafe(setup(), self._loop).result()
+
+    async def _attempt(self, payload):
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    return await asyncio.wait_for(
+                        self.backend.generate(self._client, payload), self.timeout
+                    )
+            except (RetryableError, httpx.TransportError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(self.backoff * 2**attempt + random.uniform(0, self.backoff))
+
+    async def _generate(self, payload):
+        key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._attempt(payload))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def generate(self, payload):
+        future = asyncio.run_coroutine_threadsafe(self._generate(payload), self._loop)
+        return future.result()
+
+    def stream(self, payload):
+        """Yields streamed chunks on the calling thread as the loop receives them.
+
+        If the consumer stops early or a chunk times out, the upstream stream
+        is cancelled so it releases its semaphore slot and connection.
+        """
+        chunks = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async with self._semaphore:
+                    async for text in self.backend.stream(self._client, payload):
+                        chunks.put(text)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while (item := chunks.get(timeout=self.timeout)) is not done:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+
+BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend, "fake": StubBackend}
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway(model="gemini-2.0-flash-exp"):
+    """Returns this process' gateway, creating a fresh one after a fork."""
+    global _gateway
+    if _gateway is None or _gateway.pid != os.getpid():
+        with _gateway_lock:
+            if _gateway is None or _gateway.pid != os.getpid():
+                name = os.getenv("LLM_BACKEND", "gemini")
+                backend = BACKENDS[name](model) if name == "gemini" else BACKENDS[name]()
+                _gateway = LLMGateway(
+                    backend,
+                    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 32)),
+                    timeout=float(os.getenv("LLM_TIMEOUT", 30)),
+                    retries=int(os.getenv("LLM_RETRIES", 2)),
+                )
+    return _gateway
@@ -1,47 +1,170 @@
-import os
-import pickle
+import threading
+from collections import OrderedDict, namedtuple
 from langchain.chains import RetrievalQA
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from .gemini_llm import GeminiLLM 
+from .data_loader import load_athlete_data
+from .vector_store import (
+    ATHLETE_INDEX_DIR,
+    get_embeddings,
+    load_index,
+    read_meta,
+    update_index,
+)
+from .user_corpus import user_index_dir
+from .gemini_llm import GeminiLLM
+from .gemini_api import GeminiError, record_turn
+from . import response_cache
 
+MAX_USER_CHAINS = 256
 
-def load_athlete_data():
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
-    data_path = os.path.join(project_root, "sportai_app", "static", "data", "athlete_data.txt")
-    with open(data_path, "r") as file:
-        return file.read()
+UserChain = namedtuple("UserChain", ["chain", "vectorstore", "search_kwargs", "corpus"])
 
+_athlete_store = None
+_athlete_store_lock = threading.Lock()
+_user_chains = OrderedDict()
+_user_chains_lock = threading.Lock()
 
-def load_vector_store():
-    with open("vectorstore.pkl", "rb") as f:
-        return pickle.load(f)
 
+def load_vector_store(index_dir=ATHLETE_INDEX_DIR):
+    vector_store, _ = load_index(index_dir)
+    return vector_store
 
-def create_qa_chain():
-    athlete_data = load_athlete_data()
 
-    text_splitter = CharacterTextSplitter(
-        separator="\n", chunk_size=1000, chunk_overlap=200, length_function=len
-    )
-    texts = text_splitter.split_text(athlete_data)
+def get_athlete_store():
+    """Loads the shared athlete index once per process."""
+    global _athlete_store
+    if _athlete_store is None:
+        with _athlete_store_lock:
+            if _athlete_store is None:
+                _athlete_store = update_index(ATHLETE_INDEX_DIR, load_athlete_data())
+    return _athlete_store
 
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
-    vectorstore = FAISS.from_texts(texts=texts, embedding=embeddings)
 
-    llm = GeminiLLM()
+def create_qa_chain(vectorstore=None, search_kwargs=None, userid=None):
+    if vectorstore is None:
+        vectorstore = get_athlete_store()
+
+    llm = GeminiLLM(userid=userid)
     return RetrievalQA.from_chain_type(
         llm=llm,
         chain_type="stuff",
-        retriever=vectorstore.as_retriever(),
-        return_source_documents=False,  
+        retriever=vectorstore.as_retriever(search_kwargs=search_kwargs or {}),
+        return_source_documents=False,
+    )
+
+
+def get_user_chain(userid=None):
+    """Returns the QA chain for `userid`, building it on first use.
+
+    Each user retrieves only from their own index shard, so a query never
+    scans other users' chunks. Users without a shard yet retrieve from the
+    shared athlete index. Chains carry the user's chat session and are kept
+    in an LRU, rebuilt when a new version of the user's shard is published.
+    """
+    version = None
+    if userid is not None and (meta := read_meta(user_index_dir(userid))):
+        version = meta["version"]
+    with _user_chains_lock:
+        cached = _user_chains.get(userid)
+        if cached and cached[0] == version:
+            _user_chains.move_to_end(userid)
+            return cached[1]
+    vectorstore = None
+    if version is not None:
+        vectorstore, meta = load_index(user_index_dir(userid))
+    if vectorstore is None:
+        version = None
+        vectorstore = get_athlete_store()
+        search_kwargs = {}
+        # Answers are generated with the caller's own chat history, so even
+        # users sharing the athlete index must not share cached answers; the
+        # semantic cache is a per-user repeat cache.
+        corpus = f"athlete:v{read_meta(ATHLETE_INDEX_DIR)['version']}:user:{userid}"
+    else:
+        version = meta["version"]
+        search_kwargs = {"filter": {"userid": userid}}
+        corpus = f"user:{userid}:v{version}"
+    entry = UserChain(
+        create_qa_chain(vectorstore, search_kwargs, userid),
+        vectorstore,
+        search_kwargs,
+        corpus,
+    )
+    with _user_chains_lock:
+        _user_chains[userid] = (version, entry)
+        _user_chains.move_to_end(userid)
+        while len(_user_chains) > MAX_USER_CHAINS:
+            _user_chains.popitem(last=False)
+    return entry
+
+
+def get_qa_chain(userid=None):
+    return get_user_chain(userid).chain
+
+
+def build_prompt(entry, docs, query):
+    """Stuffs the retrieved documents and the question into the chain's prompt."""
+    stuff_chain = entry.chain.combine_documents_chain
+    return stuff_chain.llm_chain.prompt.format(
+        **{
+            stuff_chain.document_variable_name: "\n\n".join(
+                doc.page_content for doc in docs
+            ),
+            "question": query,
+        }
     )
 
 
+def answer_query(query, userid=None):
+    """Answers `query` through the user's chain, reusing a cached answer to a
+    semantically similar earlier question by the same user on the same
+    corpus when possible.
+
+    Answers depend on the user's chat history, so the cache only serves a
+    user's own repeated questions, never another user's; a cached answer
+    may have been generated under an earlier history. Hits are recorded in
+    the chat session like any other turn.
+
+    The query is embedded once; the same vector drives both the cache lookup
+    and the retrieval.
+    """
+    entry = get_user_chain(userid)
+    vector = get_embeddings().embed_query(query)
+    if (response := response_cache.lookup(entry.corpus, vector)) is not None:
+        record_turn(userid, query, response)
+        return response
+
+    docs = entry.vectorstore.similarity_search_by_vector(vector, **entry.search_kwargs)
+    llm = entry.chain.combine_documents_chain.llm_chain.llm
+    response = llm.invoke(build_prompt(entry, docs, query), question=query)
+    if not response.startswith("❌"):
+        response_cache.store(entry.corpus, vector, response)
+    return response
+
+
+def stream_answer(query, userid=None):
+    """Streaming variant of answer_query that yields the answer in chunks as
+    the LLM produces them. A cache hit is yielded as a single chunk. If the
+    LLM fails midway the error is yielded last and nothing is cached."""
+    entry = get_user_chain(userid)
+    vector = get_embeddings().embed_query(query)
+    if (response := response_cache.lookup(entry.corpus, vector)) is not None:
+        record_turn(userid, query, response)
+        yield response
+        return
+
+    docs = entry.vectorstore.similarity_search_by_vector(vector, **entry.search_kwargs)
+    llm = entry.chain.combine_documents_chain.llm_chain.llm
+    parts = []
+    try:
+        for text in llm.stream(build_prompt(entry, docs, query), question=query):
+            parts.append(text)
+            yield text
+    except GeminiError as e:
+        yield f"\n\n{e}" if parts else str(e)
+        return
+    response_cache.store(entry.corpus, vector, "".join(parts))
+
+
 if __name__ == "__main__":
     qa_chain = create_qa_chain()
     while True:
@@ -0,0 +1,51 @@
+import time
+import numpy as np
+from flask import current_app
+from sportai_app import cache
+
+
+def _key(corpus):
+    return f"semantic-cache:{corpus}"
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def lookup(corpus, vector):
+    """Returns the cached response of the most similar earlier query on
+    `corpus`, if its cosine similarity reaches the configured threshold."""
+    entries = cache.get(_key(corpus))
+    if not entries:
+        return None
+    now = time.time()
+    ttl = current_app.config["SEMANTIC_CACHE_TTL"]
+    entries = [entry for entry in entries if now - entry["created"] <= ttl]
+    if not entries:
+        return None
+    matrix = np.frombuffer(
+        b"".join(entry["vector"] for entry in entries), dtype=np.float32
+    ).reshape(len(entries), -1)
+    similarities = matrix @ _normalize(vector)
+    best = int(similarities.argmax())
+    if similarities[best] < current_app.config["SEMANTIC_CACHE_THRESHOLD"]:
+        return None
+    return entries[best]["response"]
+
+
+def store(corpus, vector, response):
+    """Adds a response to the corpus' cache, dropping the oldest entries
+    beyond the configured maximum. Entries live under a key that embeds the
+    corpus' index version, so updating the data invalidates them."""
+    now = time.time()
+    ttl = current_app.config["SEMANTIC_CACHE_TTL"]
+    entries = [
+        entry for entry in cache.get(_key(corpus)) or [] if now - entry["created"] <= ttl
+    ]
+    entries.append(
+        {"vector": _normalize(vector).tobytes(), "response": response, "created": now}
+    )
+    entries = entries[-current_app.config["SEMANTIC_CACHE_MAX_ENTRIES"] :]
+    cache.set(_key(corpus), entries, timeout=ttl)
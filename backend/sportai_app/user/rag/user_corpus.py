@@ -0,0 +1,145 @@
+import os
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from sqlalchemy import and_, func, or_, select
+from langchain.docstore.document import Document
+from sportai_app import db
+from sportai_app.models import User, Health, PipelineState, SPORT_DURATIONS
+from .data_loader import split_text
+from .vector_store import INDEX_ROOT, delete_index, read_meta, update_index
+
+PIPELINE_NAME = "user-corpus"
+
+
+def user_index_dir(userid):
+    return os.path.join(INDEX_ROOT, "users", str(userid))
+
+
+def profile_document(user):
+    profile = user.to_dict()
+    text = "\n".join(
+        [
+            "--- Athlete Profile ---",
+            f"Name: {profile['name']}",
+            f"Date of Birth: {profile['dob'][:10]}",
+            f"Gender: {profile['gender']}",
+        ]
+    )
+    return split_text(
+        text, {"userid": user.userid, "kind": "profile", "group": "profile"}
+    )
+
+
+def daily_documents(userid, days=None):
+    """One summary chunk per day of the user's Health records, aggregated in
+    SQL, for the given `days` or the whole history."""
+    day = func.date(Health.timestamp)
+    query = (
+        select(
+            day.label("date"),
+            func.count().label("readings"),
+            func.avg(Health.heartbeat).label("heartbeat"),
+            func.avg(Health.blood_pressure_systolic).label("systolic"),
+            func.avg(Health.blood_pressure_diastolic).label("diastolic"),
+            func.avg(Health.hydration).label("hydration"),
+            func.max(Health.sleep_hours).label("sleep_hours"),
+            func.avg(Health.blood_oxygen).label("blood_oxygen"),
+            func.sum(Health.walking_steps).label("walking_steps"),
+            *[func.sum(getattr(Health, column)).label(column) for column in SPORT_DURATIONS],
+        )
+        .where(Health.userid == userid)
+        .group_by(day)
+        .order_by(day)
+    )
+    if days is not None:
+        if not days:
+            return []
+        query = query.where(
+            or_(
+                *[
+                    and_(
+                        Health.timestamp >= datetime.combine(date, time()),
+                        Health.timestamp < datetime.combine(date + timedelta(days=1), time()),
+                    )
+                    for date in days
+                ]
+            )
+        )
+    docs = []
+    for row in db.session.execute(query).mappings():
+        lines = [f"--- Health Summary for {row['date'].isoformat()} ---"]
+        lines.append(f"Readings: {row['readings']}")
+        for label, key, unit in [
+            ("Average Heart Rate", "heartbeat", " BPM"),
+            ("Average Blood Pressure (Systolic)", "systolic", " mmHg"),
+            ("Average Blood Pressure (Diastolic)", "diastolic", " mmHg"),
+            ("Average Hydration", "hydration", "%"),
+            ("Sleep Hours", "sleep_hours", " hours"),
+            ("Average Blood Oxygen", "blood_oxygen", "%"),
+            ("Walking Steps", "walking_steps", ""),
+        ]:
+            if row[key] is not None:
+                lines.append(f"{label}: {round(float(row[key]), 1)}{unit}")
+        for column in SPORT_DURATIONS:
+            if row[column]:
+                sport = column.replace("_duration", "").capitalize()
+                lines.append(f"{sport} Duration: {row[column]} minutes")
+        docs.append(
+            Document(
+                page_content="\n".join(lines),
+                metadata={
+                    "userid": userid,
+                    "kind": "health",
+                    "date": row["date"].isoformat(),
+                    "group": row["date"].isoformat(),
+                },
+            )
+        )
+    return docs
+
+
+def refresh_user_corpus(userid, days=None):
+    """Re-syncs the user's own index shard; only changed chunks are re-embedded.
+
+    With `days`, only the profile and those days' summaries are rebuilt and
+    the rest of the shard is kept; the first build always covers the whole
+    history.
+    """
+    user = db.session.get(User, userid)
+    if user is None:
+        return None
+    index_dir = user_index_dir(userid)
+    if read_meta(index_dir) is None:
+        days = None
+    groups = None if days is None else {"profile", *(day.isoformat() for day in days)}
+    return update_index(
+        index_dir, profile_document(user) + daily_documents(userid, days), groups
+    )
+
+
+def delete_user_corpus(userid):
+    """Removes the user's index shard along with the account."""
+    delete_index(user_index_dir(userid))
+
+
+def refresh_user_corpora():
+    """Refreshes the days of each user's shard that received Health rows
+    since the last run."""
+    state = PipelineState.get(PIPELINE_NAME)
+    high = db.session.query(func.max(Health.healthid)).scalar() or 0
+    if high <= state.watermark:
+        db.session.rollback()
+        return 0
+    touched = db.session.execute(
+        select(Health.userid, func.date(Health.timestamp))
+        .where(Health.healthid > state.watermark, Health.healthid <= high)
+        .distinct()
+    ).all()
+    days = defaultdict(set)
+    for userid, day in touched:
+        days[userid].add(day)
+    for userid, user_days in days.items():
+        refresh_user_corpus(userid, user_days)
+    state.advance(high)
+    db.session.commit()
+    return len(days)
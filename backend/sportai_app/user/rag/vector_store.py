@@ -0,0 +1,192 @@
+# vector_store.py
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from langchain_community.vectorstores import FAISS
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+# Kept outside static/, which Flask serves without authentication; the user
+# shards hold each athlete's profile and health summaries. Defaults to the
+# app's instance folder.
+INDEX_ROOT = os.environ.get("RAG_INDEX_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(current_dir))), "instance", "index"
+)
+ATHLETE_INDEX_DIR = os.path.join(INDEX_ROOT, "athlete")
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+INDEX_FORMAT = 2
+META_FILE = "index_meta.json"
+CURRENT_LINK = "current"
+LOCK_FILE = ".lock"
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings():
+    """Loads the embedding model once per process."""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                _embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    return _embeddings
+
+
+def chunk_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def live_dir(index_dir):
+    """Resolves the directory of the published version of an index, or None
+    if it has never been built.
+
+    Each version is written to its own `v<N>` directory and published by
+    atomically swapping the `current` symlink, so a reader that resolves the
+    link once always sees a matching FAISS file, pickle and sidecar.
+    """
+    link = os.path.join(index_dir, CURRENT_LINK)
+    if not os.path.exists(link):
+        return None
+    return os.path.realpath(link)
+
+
+def read_meta(index_dir):
+    version_dir = live_dir(index_dir)
+    if version_dir is None:
+        return None
+    return _read_meta(version_dir)
+
+
+def _read_meta(version_dir):
+    path = os.path.join(version_dir, META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+@contextmanager
+def index_lock(index_dir):
+    """Serializes writers of one index across threads and processes."""
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, LOCK_FILE), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def load_index(index_dir):
+    """Loads a saved index and its metadata, or returns (None, None) if it is
+    missing or was built with a different format or embedding model."""
+    version_dir = live_dir(index_dir)
+    meta = _read_meta(version_dir) if version_dir else None
+    if (
+        meta is None
+        or meta.get("format") != INDEX_FORMAT
+        or meta.get("embedding_model") != EMBEDDING_MODEL
+    ):
+        return None, None
+    vector_store = FAISS.load_local(
+        version_dir, get_embeddings(), allow_dangerous_deserialization=True
+    )
+    return vector_store, meta
+
+
+def publish_index(index_dir, vector_store, meta):
+    """Writes a new version of the index beside the live one and swaps it in.
+
+    The previous version is kept for readers that resolved it just before
+    the swap; older versions and leftovers of interrupted writes are
+    removed. Callers must hold `index_lock`.
+    """
+    name = f"v{meta['version']}"
+    staging = tempfile.mkdtemp(prefix=".tmp-", dir=index_dir)
+    vector_store.save_local(staging)
+    with open(os.path.join(staging, META_FILE), "w", encoding="utf-8") as file:
+        json.dump(meta, file, indent=2)
+    shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+    os.replace(staging, os.path.join(index_dir, name))
+
+    link = os.path.join(index_dir, ".tmp-" + CURRENT_LINK)
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(name, link)
+    os.replace(link, os.path.join(index_dir, CURRENT_LINK))
+
+    keep = {name, f"v{meta['version'] - 1}", CURRENT_LINK, LOCK_FILE}
+    for entry in os.listdir(index_dir):
+        if entry not in keep:
+            shutil.rmtree(os.path.join(index_dir, entry), ignore_errors=True)
+
+
+def delete_index(index_dir):
+    with index_lock(index_dir):
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
+def update_index(index_dir, docs, groups=None):
+    """Brings the index in `index_dir` in line with `docs`.
+
+    Chunks are keyed by the SHA-256 of their content, so only chunks that are
+    new or changed since the last build are embedded and chunks that no longer
+    exist are deleted. The index is saved with FAISS's native format next to
+    an `index_meta.json` sidecar mapping each chunk hash to its metadata
+    "group", and published atomically under the index's writer lock.
+
+    With `groups`, `docs` only covers those groups: chunks of the other
+    groups are kept as they are rather than deleted.
+    """
+    docs_by_hash = {chunk_hash(doc.page_content): doc for doc in docs}
+    with index_lock(index_dir):
+        vector_store, meta = load_index(index_dir)
+
+        if vector_store is None:
+            if not docs_by_hash:
+                return None
+            vector_store = FAISS.from_documents(
+                list(docs_by_hash.values()), get_embeddings(), ids=list(docs_by_hash)
+            )
+            chunks = {}
+            version = (read_meta(index_dir) or {}).get("version", 0) + 1
+        else:
+            chunks = meta["chunks"]
+            removed = [
+                h
+                for h, group in chunks.items()
+                if (groups is None or group in groups) and h not in docs_by_hash
+            ]
+            added = [h for h in docs_by_hash if h not in chunks]
+            if not removed and not added:
+                return vector_store
+            if removed:
+                vector_store.delete(removed)
+            if added:
+                vector_store.add_documents([docs_by_hash[h] for h in added], ids=added)
+            chunks = {h: group for h, group in chunks.items() if h not in removed}
+            version = meta["version"] + 1
+        chunks.update(
+            {h: doc.metadata.get("group") for h, doc in docs_by_hash.items()}
+        )
+
+        publish_index(
+            index_dir,
+            vector_store,
+            {
+                "format": INDEX_FORMAT,
+                "embedding_model": EMBEDDING_MODEL,
+                "version": version,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "chunks": dict(sorted(chunks.items())),
+            },
+        )
+    return vector_store
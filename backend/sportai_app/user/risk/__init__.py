@@ -0,0 +1,17 @@
+from .risk_model import (
+    FEATURES,
+    RISK_LABELS,
+    get_risk_model,
+    predict_risk,
+    feature_frame,
+    predict_risk_batch,
+)
+
+__all__ = [
+    "FEATURES",
+    "RISK_LABELS",
+    "get_risk_model",
+    "predict_risk",
+    "feature_frame",
+    "predict_risk_batch",
+]
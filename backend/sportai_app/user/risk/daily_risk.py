@@ -0,0 +1,108 @@
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sportai_app import db, ist
+from sportai_app.models import Health, DailyRisk, PipelineState, SPORT_DURATIONS
+from .risk_model import FEATURES, get_risk_model, feature_frame, predict_risk_batch
+
+PIPELINE_NAME = "daily-risk"
+
+
+def daily_features(watermark, high):
+    """Aggregates the risk features of every (user, day) that received Health
+    rows with `watermark < healthid <= high`.
+
+    Training load is the total of the sport durations for the day and HRV is
+    approximated by the standard deviation of the RR intervals implied by the
+    heartbeat readings. Features the Health table does not record are left
+    empty; they are imputed from the training data for scoring only and
+    stored as NULL.
+    """
+    day = func.date(Health.timestamp)
+    touched = (
+        select(Health.userid, day.label("date"))
+        .where(Health.healthid > watermark, Health.healthid <= high)
+        .distinct()
+        .subquery()
+    )
+    training_load = sum(
+        func.coalesce(getattr(Health, column), 0) for column in SPORT_DURATIONS
+    )
+    query = (
+        select(
+            Health.userid,
+            day.label("date"),
+            func.sum(training_load).label("training_load"),
+            func.stddev_samp(60000.0 / func.nullif(Health.heartbeat, 0)).label("hrv"),
+            func.max(Health.sleep_hours).label("sleep_hours"),
+            func.avg(Health.hydration).label("hydration_level"),
+        )
+        .join(
+            touched,
+            and_(Health.userid == touched.c.userid, day == touched.c.date),
+        )
+        .group_by(Health.userid, day)
+    )
+    df = pd.DataFrame(db.session.execute(query).mappings().all())
+    for name in FEATURES:
+        if name not in df.columns:
+            df[name] = None
+    return df
+
+
+def compute_daily_risk():
+    """Scores the days that received new Health rows since the last run and
+    upserts them into the materialized `dailyrisk` table."""
+    state = PipelineState.get(PIPELINE_NAME)
+    high = db.session.query(func.max(Health.healthid)).scalar() or 0
+    if high <= state.watermark:
+        db.session.rollback()
+        return 0
+
+    df = daily_features(state.watermark, high)
+    if len(df):
+        artifact = get_risk_model()
+        medians = {
+            name: artifact.get("medians", {}).get(header)
+            for name, header in FEATURES.items()
+        }
+        measured = df
+        df = df.fillna(value={k: v for k, v in medians.items() if v is not None})
+        df, errors = feature_frame(df)
+        now = datetime.now(ist).replace(tzinfo=None)
+        values = []
+        for (i, row), result in zip(df.iterrows(), predict_risk_batch(df, errors)):
+            if "error" in result:
+                continue
+            features = {
+                name: None if pd.isna(value) else float(value)
+                for name, value in measured.loc[i, list(FEATURES)].items()
+            }
+            values.append(
+                {
+                    "userid": int(row["userid"]),
+                    "date": row["date"],
+                    **features,
+                    "risk": result["risk"],
+                    "probabilities": result["probabilities"],
+                    "model_version": artifact["version"],
+                    "computed_at": now,
+                }
+            )
+        if values:
+            stmt = insert(DailyRisk).values(values)
+            db.session.execute(
+                stmt.on_conflict_do_update(
+                    constraint="uq_dailyrisk_userid_date",
+                    set_={
+                        column: stmt.excluded[column]
+                        for column in values[0]
+                        if column not in ("userid", "date")
+                    },
+                )
+            )
+
+    state.advance(high)
+    db.session.commit()
+    return len(df)
@@ -0,0 +1,184 @@
+import os
+import glob
+import threading
+import joblib
+import numpy as np
+import pandas as pd
+from flask import current_app
+
+FEATURES = {
+    "training_load": "Training Load",
+    "hrv": "HRV",
+    "acceleration": "Acceleration",
+    "previous_injury": "Previous Injury",
+    "sleep_hours": "Sleep Hours",
+    "hydration_level": "Hydration Level",
+    "fatigue_score": "Fatigue Score",
+}
+
+FEATURE_RANGES = {
+    "training_load": (0, None),
+    "hrv": (0, None),
+    "acceleration": (0, None),
+    "previous_injury": (0, 1),
+    "sleep_hours": (0, 24),
+    "hydration_level": (0, 100),
+    "fatigue_score": (1, 10),
+}
+
+ID_COLUMNS = ["userid", "date"]
+
+RISK_LABELS = {
+    0: ("Low Risk", "Continue training, but maintain balance."),
+    1: ("Medium Risk", "Reduce training intensity and improve recovery."),
+    2: ("High Risk", "High alert! Reduce training, hydrate well, and get proper rest."),
+}
+
+MODEL_PREFIX = "injury_risk_"
+MODEL_SUFFIX = ".joblib"
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def model_dir():
+    return current_app.config.get("RISK_MODEL_DIR") or os.path.join(
+        current_app.instance_path, "models"
+    )
+
+
+def find_model_path(directory, version=None):
+    """Returns the artifact for `version`, or the newest one in `directory`."""
+    if version:
+        path = os.path.join(directory, f"{MODEL_PREFIX}{version}{MODEL_SUFFIX}")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Risk model version {version} not found.")
+        return path
+    paths = sorted(glob.glob(os.path.join(directory, f"{MODEL_PREFIX}*{MODEL_SUFFIX}")))
+    if not paths:
+        raise FileNotFoundError(
+            f"No risk model found in {directory}. Run train_model.py first."
+        )
+    return paths[-1]
+
+
+def load_risk_model(path):
+    artifact = joblib.load(path)
+    if list(artifact["features"]) != list(FEATURES.values()):
+        raise ValueError(f"Risk model {path} was trained on different features.")
+    return artifact
+
+
+def get_risk_model():
+    """Loads the risk model artifact once per process and reuses it."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_risk_model(
+                    find_model_path(
+                        model_dir(), current_app.config.get("RISK_MODEL_VERSION")
+                    )
+                )
+    return _model
+
+
+def recommendations(features):
+    tips = []
+    if features["hydration_level"] < 50:
+        tips.append(
+            "Try increasing your hydration level to at least 50% for better recovery."
+        )
+    if features["sleep_hours"] < 7:
+        tips.append("Try getting at least 7 hours of sleep to reduce fatigue.")
+    if features["fatigue_score"] > 7:
+        tips.append(
+            "Your fatigue score is high! Reduce training intensity for better recovery."
+        )
+    if features["training_load"] > 150:
+        tips.append("Consider reducing your training load to avoid overexertion.")
+    return tips
+
+
+def predict_risk(features):
+    artifact = get_risk_model()
+    model = artifact["model"]
+    row = np.array([[float(features[name]) for name in FEATURES]])
+    probabilities = model.predict_proba(row)[0]
+    risk = int(model.classes_[probabilities.argmax()])
+    label, suggestion = RISK_LABELS[risk]
+    return {
+        "risk": risk,
+        "label": label,
+        "suggestion": suggestion,
+        "probabilities": {
+            RISK_LABELS[int(cls)][0]: round(float(prob), 4)
+            for cls, prob in zip(model.classes_, probabilities)
+        },
+        "recommendations": recommendations(features),
+        "model_version": artifact["version"],
+    }
+
+
+def feature_frame(data):
+    """Normalises a list of rows or a DataFrame into typed feature columns.
+
+    Columns may use either the API names (`training_load`) or the dataset
+    headers (`Training Load`). Returns the frame and a Series holding the
+    rejection reason of every invalid row (empty string for valid rows).
+    """
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(list(data))
+    df = df.rename(columns={header: name for name, header in FEATURES.items()})
+    missing = [name for name in FEATURES if name not in df.columns]
+    if missing:
+        raise ValueError(f"Missing feature columns: {', '.join(missing)}")
+
+    errors = pd.Series("", index=df.index, dtype=object)
+    for name, (low, high) in FEATURE_RANGES.items():
+        values = pd.to_numeric(df[name], errors="coerce")
+        invalid = values.isna()
+        if low is not None:
+            invalid |= values < low
+        if high is not None:
+            invalid |= values > high
+        errors[invalid & (errors == "")] = f"Invalid value for {name}"
+        df[name] = values.astype(float)
+    return df, errors
+
+
+def predict_risk_batch(df, errors):
+    """Scores every valid row of `df` with a single predict_proba call and
+    returns an iterator of one result dict per input row, in input order.
+
+    Loading the model and scoring happen before this returns, so a missing
+    or broken artifact fails the request before a streamed response starts.
+    """
+    artifact = get_risk_model()
+    model = artifact["model"]
+    valid = (errors == "").to_numpy()
+    ids = [column for column in ID_COLUMNS if column in df.columns]
+
+    risks = np.zeros(len(df), dtype=int)
+    probabilities = np.zeros((len(df), len(model.classes_)))
+    if valid.any():
+        rows = df.loc[valid, list(FEATURES)].to_numpy(dtype=float)
+        probabilities[valid] = model.predict_proba(rows)
+        risks[valid] = model.classes_[probabilities[valid].argmax(axis=1)]
+
+    class_labels = [RISK_LABELS[int(cls)][0] for cls in model.classes_]
+    records = df[ids].to_dict("records") if ids else [{}] * len(df)
+    return _risk_results(records, errors, risks, probabilities, class_labels)
+
+
+def _risk_results(records, errors, risks, probabilities, class_labels):
+    for i, (record, error) in enumerate(zip(records, errors)):
+        result = {"row": i, **record}
+        if error:
+            result["error"] = error
+        else:
+            result["risk"] = int(risks[i])
+            result["label"] = RISK_LABELS[int(risks[i])][0]
+            result["probabilities"] = dict(
+                zip(class_labels, np.round(probabilities[i], 4).tolist())
+            )
+        yield result
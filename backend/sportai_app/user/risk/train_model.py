@@ -0,0 +1,55 @@
+# train_model.py
+import os
+import sys
+import joblib
+import pandas as pd
+from datetime import datetime, timezone
+from sklearn.model_selection import train_test_split
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from risk_model import FEATURES, MODEL_PREFIX, MODEL_SUFFIX
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(current_dir))))
+DATA_PATH = os.path.join(project_root, "SportAI Risk Data.csv")
+MODEL_DIR = os.environ.get("RISK_MODEL_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(current_dir))), "instance", "models"
+)
+
+
+def train_risk_model(data_path=DATA_PATH, model_dir=MODEL_DIR):
+    """Trains the injury risk model offline and saves a versioned artifact."""
+    df = pd.read_csv(data_path)
+    df["Previous Injury"] = df["Previous Injury"].astype(int)
+    df["Injury Risk"] = df["Injury Risk"].astype(int)
+
+    X = df[list(FEATURES.values())].to_numpy(dtype=float)
+    y = df["Injury Risk"].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42
+    )
+
+    rf = RandomForestClassifier(n_estimators=100, random_state=42)
+    rf.fit(X_train, y_train)
+    accuracy = rf.score(X_test, y_test)
+
+    version = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    os.makedirs(model_dir, exist_ok=True)
+    path = os.path.join(model_dir, f"{MODEL_PREFIX}{version}{MODEL_SUFFIX}")
+    joblib.dump(
+        {
+            "model": rf,
+            "features": list(FEATURES.values()),
+            "version": version,
+            "accuracy": accuracy,
+            "medians": df[list(FEATURES.values())].median().to_dict(),
+        },
+        path,
+    )
+    print(f"Risk model {version} saved to '{path}' (test accuracy {accuracy:.3f}).")
+    return path
+
+
+if __name__ == "__main__":
+    train_risk_model(*sys.argv[1:])
@@ -0,0 +1,133 @@
+from datetime import datetime
+from sqlalchemy import and_, cast, func, literal, select, Date, DateTime
+from sqlalchemy.dialects.postgresql import insert
+from sportai_app import db, ist
+from sportai_app.models import (
+    Health,
+    HealthDailyRollup,
+    HealthWeeklyRollup,
+    PipelineState,
+    SPORT_DURATIONS,
+)
+
+PIPELINE_NAME = "health-rollups"
+
+SUM_COLUMNS = ["walking_steps"] + SPORT_DURATIONS
+AVERAGED = ["heartbeat", "sleep_hours", "hydration"]
+ROLLUP_COLUMNS = (
+    ["readings"]
+    + [f"{name}_{part}" for name in AVERAGED for part in ("sum", "count")]
+    + SUM_COLUMNS
+    + ["updated_at"]
+)
+
+
+def _upsert(model, keys, constraint, query):
+    stmt = insert(model).from_select(keys + ROLLUP_COLUMNS, query)
+    return db.session.execute(
+        stmt.on_conflict_do_update(
+            constraint=constraint,
+            set_={column: stmt.excluded[column] for column in ROLLUP_COLUMNS},
+        )
+    )
+
+
+def refresh_rollups():
+    """Recomputes the daily rollups of every (user, day) that received Health
+    rows since the last run, then the weekly rollups containing those days.
+
+    Both steps run as INSERT ... SELECT ... ON CONFLICT statements, so only
+    the touched days' raw rows and the touched weeks' daily rows are read.
+    Returns the number of daily rollups written.
+    """
+    state = PipelineState.get(PIPELINE_NAME)
+    high = db.session.query(func.max(Health.healthid)).scalar() or 0
+    if high <= state.watermark:
+        db.session.rollback()
+        return 0
+    now = datetime.now(ist).replace(tzinfo=None)
+
+    day = cast(func.date(Health.timestamp), Date)
+    touched = (
+        select(Health.userid, day.label("day"))
+        .where(Health.healthid > state.watermark, Health.healthid <= high)
+        .distinct()
+        .subquery()
+    )
+    daily = (
+        select(
+            Health.userid,
+            day,
+            func.count(),
+            *[
+                aggregate(getattr(Health, column))
+                for column in AVERAGED
+                for aggregate in (func.sum, func.count)
+            ],
+            *[func.sum(getattr(Health, column)) for column in SUM_COLUMNS],
+            literal(now, DateTime),
+        )
+        .join(touched, and_(Health.userid == touched.c.userid, day == touched.c.day))
+        .group_by(Health.userid, day)
+    )
+    days = _upsert(
+        HealthDailyRollup,
+        ["userid", "day"],
+        "uq_healthdailyrollup_userid_day",
+        daily,
+    )
+
+    week = cast(func.date_trunc("week", HealthDailyRollup.day), Date)
+    touched_weeks = (
+        select(
+            touched.c.userid,
+            cast(func.date_trunc("week", touched.c.day), Date).label("week_start"),
+        )
+        .distinct()
+        .subquery()
+    )
+    weekly = (
+        select(
+            HealthDailyRollup.userid,
+            week,
+            func.sum(HealthDailyRollup.readings),
+            *[
+                func.sum(getattr(HealthDailyRollup, f"{column}_{part}"))
+                for column in AVERAGED
+                for part in ("sum", "count")
+            ],
+            *[func.sum(getattr(HealthDailyRollup, column)) for column in SUM_COLUMNS],
+            literal(now, DateTime),
+        )
+        .join(
+            touched_weeks,
+            and_(
+                HealthDailyRollup.userid == touched_weeks.c.userid,
+                week == touched_weeks.c.week_start,
+            ),
+        )
+        .group_by(HealthDailyRollup.userid, week)
+    )
+    _upsert(
+        HealthWeeklyRollup,
+        ["userid", "week_start"],
+        "uq_healthweeklyrollup_userid_week_start",
+        weekly,
+    )
+
+    state.advance(high)
+    db.session.commit()
+    return days.rowcount
+
+
+def read_rollups(userid, period="daily", start=None, end=None):
+    model, column = {
+        "daily": (HealthDailyRollup, HealthDailyRollup.day),
+        "weekly": (HealthWeeklyRollup, HealthWeeklyRollup.week_start),
+    }[period]
+    query = model.query.filter(model.userid == userid)
+    if start is not None:
+        query = query.filter(column >= start)
+    if end is not None:
+        query = query.filter(column < end)
+    return query.order_by(column).all()
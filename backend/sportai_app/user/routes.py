@@ -1,8 +1,18 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import os
-from flask import jsonify, request, current_app
+import json
+import pandas as pd
+from flask import jsonify, request, current_app, Response, stream_with_context
 from sportai_app import db, bcrypt, ist
-from sportai_app.models import User, BlacklistedToken
+import numpy as np
+from sportai_app.models import (
+    User,
+    BlacklistedToken,
+    DailyRisk,
+    Health,
+    HEALTH_FIELDS,
+    EcgStrip,
+)
 from sportai_app.utils import (
     delete_file,
     save_file,
@@ -10,24 +20,36 @@ from sportai_app.utils import (
     validate_file,
     generate_secure_password,
     send_password_email,
+    revoke_token,
+    token_id,
+    forget_user,
+    clear_user_cache,
+    cached_response,
+    encode_cursor,
+    decode_cursor,
+    query_arg,
 )
 from sportai_app.user.forms import (
     UpdateProfileForm,
     ChangePasswordForm,
     DeleteAccountForm,
     ChatForm,
+    RiskForm,
 )
+from sportai_app.tasks import user_corpus as refresh_user_corpus
 from . import user
-from .rag.qa_chain import create_qa_chain  # Updated import path
+from .risk import predict_risk, feature_frame, predict_risk_batch
+from .health_ingest import parse_rows, validate_rows, insert_rows
+from .rollups import read_rollups
+from . import ecg
+from .analytics import user_metrics
+from .rag.qa_chain import answer_query, stream_answer
+from .rag.user_corpus import delete_user_corpus
 import jwt
-import threading
-
-
-qa_chain = create_qa_chain()
 
 
 @user.route("/chat", methods=["POST"])
-def chat():
+def chat(userid):
     if not request.is_json:
         return jsonify({"error": "Request must be JSON"}), 400
 
@@ -36,12 +58,224 @@ def chat():
         return jsonify({"error": form_errors(form.errors)}), 400
 
     try:
-        response = qa_chain.run(form.query.data)
+        response = answer_query(form.query.data, userid)
         return jsonify({"response": response}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@user.route("/chat/stream", methods=["POST"])
+def chat_stream(userid):
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    form = ChatForm(data=request.get_json())
+    if not form.validate():
+        return jsonify({"error": form_errors(form.errors)}), 400
+
+    def events():
+        try:
+            for text in stream_answer(form.query.data, userid):
+                yield f"data: {json.dumps({'token': text})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@user.route("/risk", methods=["POST"])
+def risk():
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    form = RiskForm(data=request.get_json())
+    if not form.validate():
+        return jsonify({"error": form_errors(form.errors)}), 400
+
+    return jsonify(predict_risk(form.data)), 200
+
+
+@user.route("/risk/batch", methods=["POST"])
+def risk_batch():
+    max_rows = current_app.config["RISK_BATCH_MAX_ROWS"]
+    try:
+        if file := request.files.get("file"):
+            if return_val := validate_file(file, "csv"):
+                return jsonify(return_val), 400
+            rows = pd.read_csv(file, nrows=max_rows + 1)
+        elif request.is_json and isinstance(request.get_json(), list):
+            rows = request.get_json()
+        else:
+            return jsonify({"error": "Request must be a JSON array or a CSV file"}), 400
+
+        if len(rows) > max_rows:
+            return jsonify({"error": "Too many rows in a single batch."}), 400
+        df, errors = feature_frame(rows)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    results = predict_risk_batch(df, errors)
+    return Response(
+        stream_with_context(json.dumps(result) + "\n" for result in results),
+        mimetype="application/x-ndjson",
+    )
+
+
+@user.route("/risk/daily", methods=["GET"])
+def daily_risk(userid):
+    days = request.args.get("days", 30, type=int)
+    since = datetime.now(ist).date() - timedelta(days=days)
+    records = (
+        DailyRisk.query.filter(DailyRisk.userid == userid, DailyRisk.date >= since)
+        .order_by(DailyRisk.date.desc())
+        .all()
+    )
+    return jsonify([record.to_dict() for record in records]), 200
+
+
+@user.route("/health", methods=["GET"])
+def health_history(userid):
+    fields = request.args.get("fields")
+    fields = fields.split(",") if fields else HEALTH_FIELDS
+    if unknown := [field for field in fields if field not in HEALTH_FIELDS]:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+    limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+    try:
+        start = query_arg("start", datetime.fromisoformat)
+        end = query_arg("end", datetime.fromisoformat)
+        after = decode_cursor(cursor) if (cursor := request.args.get("cursor")) else None
+    except ValueError:
+        return jsonify({"error": "Invalid start, end or cursor."}), 400
+
+    rows = Health.page(userid, fields, start, end, after, limit)
+    records = [
+        {
+            "healthid": row["healthid"],
+            "timestamp": row["timestamp"].isoformat(),
+            **{field: row[field] for field in fields},
+        }
+        for row in rows
+    ]
+    next_cursor = (
+        encode_cursor(rows[-1]["timestamp"], rows[-1]["healthid"])
+        if len(rows) == limit
+        else None
+    )
+    return jsonify({"records": records, "next_cursor": next_cursor}), 200
+
+
+@user.route("/health/rollups", methods=["GET"])
+def health_rollups(userid):
+    period = request.args.get("period", "daily")
+    if period not in ("daily", "weekly"):
+        return jsonify({"error": "Period must be daily or weekly."}), 400
+    try:
+        start = query_arg("start", date.fromisoformat)
+        end = query_arg("end", date.fromisoformat)
+    except ValueError:
+        return jsonify({"error": "Invalid start or end."}), 400
+    rollups = read_rollups(userid, period, start, end)
+    return jsonify([rollup.to_dict() for rollup in rollups]), 200
+
+
+@user.route("/health/ecg", methods=["POST"])
+def upload_ecg(userid):
+    try:
+        if request.is_json:
+            data = request.get_json()
+            if not isinstance(data, dict):
+                return jsonify({"error": "Request body must be a JSON object."}), 400
+            sample_rate = data.get("sample_rate")
+            samples = np.asarray(data.get("samples", []))
+            recorded_at = data.get("timestamp")
+        else:
+            sample_rate = request.args.get("sample_rate", type=int)
+            samples = np.frombuffer(request.get_data(), dtype="<i2")
+            recorded_at = request.args.get("timestamp")
+    except ValueError:
+        return jsonify({"error": "Samples must be a flat list of 16-bit integers."}), 400
+    if not isinstance(sample_rate, int) or not 1 <= sample_rate <= 65535:
+        return jsonify({"error": "sample_rate must be an integer in Hz."}), 400
+    if samples.ndim != 1:
+        return jsonify({"error": "Samples must be a flat list of 16-bit integers."}), 400
+    if not 0 < len(samples) <= current_app.config["ECG_MAX_SAMPLES"]:
+        return jsonify({"error": "The ECG strip is empty or too long."}), 400
+    if (
+        samples.dtype.kind not in "iu"
+        or samples.min() < -32768
+        or samples.max() > 32767
+    ):
+        return jsonify({"error": "Samples must be 16-bit integers."}), 400
+    try:
+        recorded_at = (
+            datetime.fromisoformat(recorded_at)
+            if recorded_at
+            else datetime.now(ist).replace(tzinfo=None)
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid timestamp."}), 400
+
+    strip = EcgStrip(
+        userid=userid,
+        recorded_at=recorded_at,
+        sample_rate=sample_rate,
+        sample_count=len(samples),
+        data=ecg.encode(samples, sample_rate),
+    )
+    db.session.add(strip)
+    db.session.commit()
+    return jsonify(strip.to_dict()), 201
+
+
+@user.route("/health/ecg/<int:ecgid>", methods=["GET"])
+def read_ecg(userid, ecgid):
+    strip = EcgStrip.query.filter_by(ecgid=ecgid, userid=userid).first()
+    if not strip:
+        return jsonify({"error": "ECG strip not found."}), 404
+    samples, sample_rate = ecg.decode(strip.data)
+    if points := request.args.get("points", type=int):
+        preview = ecg.downsample(samples, points)
+        sample_rate = sample_rate * len(preview) / len(samples)
+        samples = preview
+    return Response(
+        samples.astype("<i2").tobytes(),
+        mimetype="application/octet-stream",
+        headers={
+            "X-Sample-Rate": str(sample_rate),
+            "X-Sample-Count": str(len(samples)),
+            "X-Sample-Dtype": "<i2",
+        },
+    )
+
+
+@user.route("/health/metrics", methods=["GET"])
+def health_metrics(userid):
+    days = min(request.args.get("days", 28, type=int), 365)
+    return jsonify(user_metrics(userid, days)), 200
+
+
+@user.route("/health/batch", methods=["POST"])
+def health_batch(userid):
+    try:
+        rows = parse_rows(
+            request.get_data(as_text=True),
+            ndjson=request.mimetype == "application/x-ndjson",
+        )
+        if len(rows) > current_app.config["HEALTH_BATCH_MAX_ROWS"]:
+            return jsonify({"error": "Too many rows in a single batch."}), 400
+        df, rejected = validate_rows(rows)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    inserted = insert_rows(userid, df)
+    return jsonify({"inserted": inserted, "rejected": rejected}), 201
+
+
 @user.route("/is-valid", methods=["GET"])
 def is_valid(userid):
     if userid:
@@ -51,10 +285,12 @@ def is_valid(userid):
 
 
 @user.route("/account", methods=["GET"])
+@cached_response()
 def account(userid):
-    current_user = User.query.get(userid)
-    user = User.query.get(current_user.userid)
-    return jsonify(user.to_dict()), 200
+    user = User.query.get(userid)
+    response = jsonify(user.to_dict())
+    response.set_etag(user.etag)
+    return response
 
 
 @user.route("/account", methods=["POST"])
@@ -89,8 +325,13 @@ def update_profile(userid):
     current_user.phone = form.phone.data
     current_user.gender = form.gender.data
     current_user.dob = form.dob.data
+    if form.utc_offset.data is not None:
+        current_user.utc_offset = form.utc_offset.data
 
     db.session.commit()
+    forget_user(current_user.userid)
+    clear_user_cache(current_user.userid)
+    refresh_user_corpus.delay(current_user.userid)
     return jsonify({"message": "Account has been updated successfully."}), 200
 
 
@@ -135,12 +376,15 @@ def logout(userid):
         decoded = jwt.decode(
             token, current_app.config["SECRET_KEY"], algorithms=["HS256"]
         )
-        expiry = datetime.fromtimestamp(decoded["exp"], ist)
-        blacklisted_token = BlacklistedToken(token=token, expiry=expiry)
+        expiry = datetime.fromtimestamp(decoded["exp"], ist).replace(tzinfo=None)
+        blacklisted_token = BlacklistedToken(
+            jti=token_id(token, decoded), expiry=expiry
+        )
         user = User.query.get(userid)
         user.authenticated = False
         db.session.add(blacklisted_token)
         db.session.commit()
+        revoke_token(token, decoded)
         return jsonify({"message": "Logged out successfully."}), 200
     except jwt.ExpiredSignatureError:
         return jsonify({"error": "Token already expired."}), 400
@@ -166,6 +410,9 @@ def delete_account(userid):
                 )
             db.session.delete(current_user)
             db.session.commit()
+            delete_user_corpus(userid)
+            forget_user(userid)
+            clear_user_cache(userid)
 
             return jsonify({"message": "Account deleted successfully."}), 200
         else: